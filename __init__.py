@@ -1,4 +1,4 @@
-from .register import register, unregister, add_modules
+from .register import register, unregister, add_modules, maybe_reload
 import bpy
 
 bl_info = {
@@ -15,10 +15,8 @@ bl_info = {
 
 add_modules(
     [
-        'blobsketch',
-        'boolean',
-        'draw2d',
-        'interact',
+        'operators',
+        'timing',
         'ui',
         'settings'
     ]
@@ -0,0 +1,239 @@
+# turns a directory of stored outlines into blob meshes, without the modal operator
+#
+#   python batch.py outlines/ meshes/ [--workers 4] [--format ply]
+#   blender -b --python batch.py -- [same arguments]
+#
+# outlines are json point lists, one loop or a list of loops per file, or the paths and
+# shapes of svg files, one loop per closed subpath; every loop is one job on the pool
+import argparse
+import json
+import os
+import re
+import sys
+import xml.etree.ElementTree as ElementTree
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import perf_counter
+
+import numpy as np
+
+if __package__:
+    from .headless import load
+else:
+    # blender's --python does not put the script's directory on the path
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from headless import load
+
+
+def json_outlines(path):
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data['outlines']
+    loops = [data] if np.ndim(data[0]) == 1 else data
+    return [np.asarray(loop, dtype=np.float64)[:, :2] for loop in loops]
+
+
+SVG_NUMBER = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+SVG_TOKEN = re.compile(r'[MmLlHhVvCcSsQqTtAaZz]|' + SVG_NUMBER.pattern)
+SVG_ARITY = {'M': 2, 'L': 2, 'H': 1, 'V': 1, 'C': 6, 'S': 4, 'Q': 4, 'T': 2, 'A': 7, 'Z': 0}
+
+
+def bezier(points, steps):
+    # evaluates a quadratic or cubic curve by repeated interpolation, without its start point
+    t = np.linspace(0, 1, steps + 1)[1:, None]
+    points = [np.asarray(p) for p in points]
+    while len(points) > 1:
+        points = [a + (b - a) * t for a, b in zip(points, points[1:])]
+    return list(points[0])
+
+
+def svg_path_loops(d, steps=16):
+    # subpaths of a path's d attribute as polylines; curves are flattened, arcs become lines
+    loops = []
+    points = []
+    tokens = SVG_TOKEN.findall(d)
+    pos = start = control = np.zeros(2)
+    i = 0
+    command = None
+    while i < len(tokens):
+        if tokens[i].isalpha():
+            command = tokens[i]
+            i += 1
+        upper = command.upper()
+        args = [float(v) for v in tokens[i:i + SVG_ARITY[upper]]]
+        i += SVG_ARITY[upper]
+        relative = command.islower() and upper != 'Z'
+        base = pos if relative else np.zeros(2)
+
+        if upper == 'Z':
+            if len(points) > 2:
+                loops.append(points)
+            points = []
+            pos = start
+            continue
+        if upper == 'M':
+            if len(points) > 2:
+                loops.append(points)
+            pos = start = base + args
+            points = [pos]
+            command = 'l' if relative else 'L'
+            continue
+
+        if upper == 'H':
+            end = np.array((args[0] + base[0], pos[1]))
+        elif upper == 'V':
+            end = np.array((pos[0], args[0] + base[1]))
+        else:
+            end = base + args[-2:]
+
+        if upper in 'CS':
+            c1 = 2 * pos - control if upper == 'S' else base + args[:2]
+            c2 = base + args[-4:-2]
+            points += bezier((pos, c1, c2, end), steps)
+            control = c2
+        elif upper in 'QT':
+            c1 = 2 * pos - control if upper == 'T' else base + args[:2]
+            points += bezier((pos, c1, end), steps)
+            control = c1
+        else:
+            points.append(end)
+        if upper not in 'CSQT':
+            control = end
+        pos = end
+
+    if len(points) > 2:
+        loops.append(points)
+    return [np.array(loop) for loop in loops]
+
+
+def svg_outlines(path, steps=64):
+    # paths, polygons, polylines, circles and ellipses; transforms are not applied
+    loops = []
+    for element in ElementTree.parse(path).iter():
+        tag = element.tag.rsplit('}', 1)[-1]
+        get = lambda name: float(element.get(name, 0))
+        if tag == 'path':
+            loops += svg_path_loops(element.get('d', ''))
+        elif tag in ('polygon', 'polyline'):
+            loops.append(np.array([float(v) for v in SVG_NUMBER.findall(element.get('points', ''))]).reshape(-1, 2))
+        elif tag in ('circle', 'ellipse'):
+            t = np.linspace(0, 2 * np.pi, steps, endpoint=False)
+            rx, ry = (get('r'), get('r')) if tag == 'circle' else (get('rx'), get('ry'))
+            loops.append(np.stack((get('cx') + rx * np.cos(t), get('cy') + ry * np.sin(t)), axis=1))
+    # svg's y axis points down
+    return [loop * (1, -1) for loop in loops if len(loop) > 2]
+
+
+READERS = {
+    '.json': json_outlines,
+    '.svg': svg_outlines,
+}
+
+
+def write_obj(path, verts, faces):
+    with open(path, 'w') as f:
+        np.savetxt(f, verts, fmt='v %.6f %.6f %.6f')
+        np.savetxt(f, faces + 1, fmt='f' + ' %d' * faces.shape[1])
+
+
+def write_ply(path, verts, faces):
+    header = '\n'.join((
+        'ply', 'format binary_little_endian 1.0',
+        'element vertex {}'.format(len(verts)), 'property float x', 'property float y', 'property float z',
+        'element face {}'.format(len(faces)), 'property list uchar int vertex_indices', 'end_header', ''))
+    face_rows = np.zeros(len(faces), dtype=[('n', '<u1'), ('i', '<i4', (faces.shape[1],))])
+    face_rows['n'] = faces.shape[1]
+    face_rows['i'] = faces
+    with open(path, 'wb') as f:
+        f.write(header.encode('ascii'))
+        f.write(np.ascontiguousarray(verts, dtype='<f4').tobytes())
+        f.write(face_rows.tobytes())
+
+
+WRITERS = {
+    'obj': write_obj,
+    'ply': write_ply,
+}
+
+
+def blob_job(outline, path, options):
+    # resample, medial axis and mesher for one loop, the mesh is written from the worker
+    geometry = load('geometry')
+    mesher = load('mesher')
+    start = perf_counter()
+    loop = geometry.resample_loop(outline * options['scale'], options['quality'], options['adaptive'])
+    if options['medial'] == 'DELAUNAY':
+        centers, radii = geometry.delaunay_medial(loop)
+    else:
+        centers, radii = geometry.medial_search(loop)
+
+    centers = np.column_stack((centers, np.zeros(len(centers))))
+    if options['budget']:
+        voxel = mesher.budget_voxel(centers, radii, options['budget'])
+    else:
+        voxel = mesher.blob_voxel(centers, radii, options['resolution'])
+    verts, faces = mesher.polygonize_balls(centers, radii, voxel, threshold=0.01)
+    WRITERS[options['format']](path, verts, faces)
+    return len(verts), len(faces), perf_counter() - start
+
+
+def collect(source, output, extension):
+    jobs = []
+    for name in sorted(os.listdir(source)):
+        stem, ext = os.path.splitext(name)
+        if ext.lower() not in READERS:
+            continue
+        loops = READERS[ext.lower()](os.path.join(source, name))
+        for k, loop in enumerate(loops):
+            suffix = '_{}'.format(k) if len(loops) > 1 else ''
+            jobs.append((loop, os.path.join(output, stem + suffix + '.' + extension)))
+    return jobs
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='mesh a directory of outlines into blobs')
+    parser.add_argument('source', help='directory of .json and .svg outlines')
+    parser.add_argument('output', help='directory the meshes are written to')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--format', default='obj', choices=list(WRITERS))
+    parser.add_argument('--scale', type=float, default=0.01, help='mesh units per outline unit')
+    parser.add_argument('--quality', type=int, default=200, help='samples along each outline')
+    parser.add_argument('--adaptive', type=float, default=0.0)
+    parser.add_argument('--medial', default='STEP', choices=['STEP', 'DELAUNAY'])
+    parser.add_argument('--resolution', type=float, default=40)
+    parser.add_argument('--budget', type=int, default=0, help='polygons to aim for, overrides the resolution')
+    args = parser.parse_args(argv)
+
+    if args.medial == 'DELAUNAY':
+        try:
+            import mathutils
+        except ImportError:
+            parser.error('the delaunay medial axis needs mathutils, run inside blender')
+
+    options = {key: getattr(args, key) for key in ('scale', 'quality', 'adaptive', 'medial', 'resolution', 'budget', 'format')}
+    os.makedirs(args.output, exist_ok=True)
+    start = perf_counter()
+    jobs = collect(args.source, args.output, args.format)
+    failed = 0
+    with ProcessPoolExecutor(max(args.workers, 1)) as pool:
+        futures = {pool.submit(blob_job, loop, path, options): path for loop, path in jobs}
+        for future in as_completed(futures):
+            path = os.path.basename(futures[future])
+            try:
+                verts, faces, elapsed = future.result()
+            except Exception as e:
+                failed += 1
+                print('{:<40} failed: {}'.format(path, e))
+                continue
+            print('{:<40} {:>8} verts {:>8} faces {:>8.1f} ms'.format(path, verts, faces, elapsed * 1000))
+
+    elapsed = perf_counter() - start
+    done = len(jobs) - failed
+    print('\n{} outlines in {:.2f} s, {:.1f} outlines/s on {} workers{}'.format(
+        done, elapsed, done / max(elapsed, 1e-9), args.workers, ', {} failed'.format(failed) if failed else ''))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else sys.argv[1:]
+    sys.exit(main(argv))
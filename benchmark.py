@@ -0,0 +1,312 @@
+# headless benchmarks for the blob sketch and boolean pipelines
+#
+#   python benchmark.py [--tiers small medium] [--save base.json] [--compare base.json]
+#   blender -b --python benchmark.py -- [same arguments]
+#
+# plain python runs the numpy stages, with a stand-in for the bit of mathutils they use;
+# inside blender the stages that go through bpy run as well
+import argparse
+import json
+import os
+import sys
+import tracemalloc
+import types
+from time import perf_counter
+
+import numpy as np
+
+if __package__:
+    from .headless import load
+else:
+    # blender's --python does not put the script's directory on the path
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from headless import load
+
+TIERS = {
+    'small': {'points': 500, 'quality': 200, 'segments': 16, 'voxel': 0.05},
+    'medium': {'points': 2000, 'quality': 1000, 'segments': 48, 'voxel': 0.02},
+    'large': {'points': 8000, 'quality': 4000, 'segments': 128, 'voxel': 0.01},
+}
+
+
+def mathutils_stand_in():
+    # only delaunay_2d_cdt is needed headless; scipy's delaunay is unconstrained,
+    # which times the same work, the triangles outside the loop are dropped by radius anyway
+    try:
+        import mathutils
+        return True
+    except ImportError:
+        pass
+
+    try:
+        from scipy.spatial import Delaunay
+    except ImportError:
+        return False
+
+    def delaunay_2d_cdt(verts, edges, faces, output_type, epsilon):
+        return verts, [], Delaunay(np.array(verts)).simplices.tolist(), [], [], []
+
+    mathutils = types.ModuleType('mathutils')
+    mathutils.geometry = types.ModuleType('mathutils.geometry')
+    mathutils.geometry.delaunay_2d_cdt = delaunay_2d_cdt
+    sys.modules['mathutils'] = mathutils
+    sys.modules['mathutils.geometry'] = mathutils.geometry
+    return True
+
+
+def has_bpy():
+    try:
+        import bpy
+        return hasattr(bpy, 'data')
+    except ImportError:
+        return False
+
+
+def circle_loop(n, radius=200.0):
+    t = np.linspace(0, 2 * np.pi, n, endpoint=False)
+    return np.stack((np.cos(t), np.sin(t)), axis=1) * radius
+
+
+def spiral_loop(n, turns=2.5, width=30.0):
+    # outline of a thick spiral stroke, out along one side and back along the other
+    t = np.linspace(0.5, turns * 2 * np.pi, n // 2)
+    r = 20 * t
+    side = np.stack((np.cos(t), np.sin(t)), axis=1)
+    return np.concatenate(((r + width / 2)[:, None] * side, ((r - width / 2)[:, None] * side)[::-1]))
+
+
+def freehand_loop(n, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.linspace(0, 2 * np.pi, n, endpoint=False)
+    r = 200 * (1 + sum(rng.uniform(-0.08, 0.08) * np.sin(k * t + rng.uniform(0, 2 * np.pi)) for k in range(2, 7)))
+    r += rng.normal(0, 1.5, n)
+    return np.stack((np.cos(t), np.sin(t)), axis=1) * r[:, None]
+
+
+def branching_loop(n, arms=7, hub=40.0, length=250.0, width=0.03):
+    corners = []
+    for a in np.linspace(0, 2 * np.pi, arms, endpoint=False):
+        for angle, radius in ((a - 0.2, hub), (a - width, length), (a + width, length), (a + 0.2, hub)):
+            corners.append((np.cos(angle) * radius, np.sin(angle) * radius))
+    return load('geometry').resample_loop(np.array(corners), n)
+
+
+SHAPES = {
+    'circle': circle_loop,
+    'spiral': spiral_loop,
+    'freehand': freehand_loop,
+    'branching': branching_loop,
+}
+
+
+def sphere(segments, center=(0, 0, 0), radius=1.0):
+    rings = segments
+    th = np.linspace(0, np.pi, rings + 1)[1:-1]
+    ph = np.linspace(0, 2 * np.pi, 2 * segments, endpoint=False)
+    t, p = np.meshgrid(th, ph, indexing='ij')
+    co = np.stack((np.sin(t) * np.cos(p), np.sin(t) * np.sin(p), np.cos(t)), axis=-1).reshape(-1, 3)
+    co = np.concatenate((co, [(0, 0, 1), (0, 0, -1)])) * radius + center
+
+    m = 2 * segments
+    i, j = np.meshgrid(np.arange(rings - 2), np.arange(m), indexing='ij')
+    a = (i * m + j).ravel()
+    b = (i * m + (j + 1) % m).ravel()
+    c = a + m
+    d = b + m
+    top, bottom = len(co) - 2, len(co) - 1
+    ring = np.arange(m)
+    last = (rings - 2) * m
+    tris = np.concatenate((
+        np.stack((a, c, b), axis=1), np.stack((b, c, d), axis=1),
+        np.stack((np.full(m, top), ring, (ring + 1) % m), axis=1),
+        np.stack((np.full(m, bottom), last + (ring + 1) % m, last + ring), axis=1),
+    ))
+    return co, tris
+
+
+def mesh_pair(segments):
+    return sphere(segments), sphere(segments, (0.7, 0.2, 0.1), 0.8)
+
+
+def stroke_stages(raw, tier):
+    geometry = load('geometry')
+    mesher = load('mesher')
+    loop = geometry.resample_loop(raw, tier['quality'])
+    centers, radii = geometry.medial_search(loop)
+
+    def stroke_filter():
+        stroke = geometry.StrokeFilter()
+        for point in raw.tolist():
+            stroke.add(point)
+
+    def preview():
+        # the stroke streams in, then every stale circle is drained in the preview's own
+        # chunks; an unlimited budget makes the stage time the work, not the time slicing
+        medial = geometry.MedialPreview(budget=float('inf'))
+        for point in raw.tolist():
+            medial.add_point(point)
+        while medial.update():
+            pass
+
+    def mesher_stage():
+        co = np.column_stack((centers, np.zeros(len(centers)))) * 0.01
+        extent = np.ptp(co[:, :2], axis=0).min() + 2 * radii.max() * 0.01
+        mesher.polygonize_balls(co, radii * 0.01, extent / 40)
+
+    stages = [
+        ('stroke_filter', stroke_filter),
+        ('resample', lambda: geometry.resample_loop(raw, tier['quality'])),
+        ('medial_step', lambda: geometry.medial_search(loop)),
+    ]
+    if mathutils_stand_in():
+        stages.append(('medial_delaunay', lambda: geometry.delaunay_medial(loop)))
+    stages += [('preview', preview), ('mesher', mesher_stage)]
+
+    if has_bpy():
+        stages.append(('create_blob', lambda: blender_create_blob(centers, radii)))
+    return stages
+
+
+def mesh_stages(pair, tier):
+    geometry = load('geometry')
+    voxel = load('voxel')
+
+    def voxel_boolean():
+        return voxel.voxel_boolean(list(pair), 'DIFFERENCE', tier['voxel'])
+
+    co, faces = voxel_boolean()
+    edges = np.stack((faces, np.roll(faces, -1, axis=1)), axis=-1).reshape(-1, 2)
+
+    stages = [
+        ('voxel_boolean', voxel_boolean),
+        ('loose_parts', lambda: geometry.loose_parts(len(co), edges)),
+    ]
+    if has_bpy():
+        stages.append(('boolean_exact', lambda: blender_boolean(pair)))
+    return stages
+
+
+def blender_create_blob(centers, radii):
+    import bpy
+    from mathutils import Vector, Quaternion
+    blobsketch = load('blobsketch')
+    frame = types.SimpleNamespace(location=Vector((0, 0, 0)), rotation=Quaternion(), resolution=40, budget=0, reduce=False,
+                                  local=lambda c, r: (np.column_stack((c, np.zeros(len(c)))) * 0.01, r * 0.01))
+    blobsketch.create_blob(centers, radii, bpy.context, frame)
+    remove_objects([bpy.context.active_object])
+
+
+def blender_boolean(pair):
+    import bpy
+    mesher = load('mesher')
+    boolean = load('boolean')
+    objects = []
+    for co, tris in pair:
+        ob = bpy.data.objects.new('bench', mesher.mesh_from_arrays('bench', co, tris))
+        bpy.context.collection.objects.link(ob)
+        objects.append(ob)
+    boolean.bool_apply(objects[:1], objects[1], 'DIFFERENCE')
+    remove_objects(objects)
+
+
+def remove_objects(objects):
+    import bpy
+    for ob in objects:
+        data = ob.data
+        bpy.data.objects.remove(ob)
+        if data and not data.users:
+            getattr(bpy.data, 'meshes' if data.id_type == 'MESH' else 'metaballs').remove(data)
+
+
+def measure(func, repeat):
+    # best of `repeat` untraced runs, then one traced run for the peak of python and numpy allocations
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        func()
+        times.append(perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times), peak
+
+
+def run(tiers, shapes, repeat):
+    results = {}
+    for tier_name in tiers:
+        tier = TIERS[tier_name]
+        cases = [(shape, stroke_stages(SHAPES[shape](tier['points']), tier)) for shape in shapes]
+        cases.append(('spheres', mesh_stages(mesh_pair(tier['segments']), tier)))
+        for case, stages in cases:
+            for stage, func in stages:
+                key = '/'.join((stage, case, tier_name))
+                elapsed, peak = measure(func, repeat)
+                results[key] = {'time': elapsed, 'peak': peak}
+                print('{:<40} {:>10.2f} ms {:>9.1f} MB'.format(key, elapsed * 1000, peak / 2 ** 20))
+    return results
+
+
+def scaling(repeat, samples=(500, 2000)):
+    # how the step search grows with the sample count on a round loop, where every probe
+    # ends near the single medial point, about as close to all segments; a baseline
+    # saved from a slow engine would hide this from compare
+    geometry = load('geometry')
+    times = []
+    for n in samples:
+        loop = circle_loop(n)
+        times.append(measure(lambda: geometry.medial_search(loop), repeat)[0])
+    exponent = np.log(times[1] / times[0]) / np.log(samples[1] / samples[0])
+    print('\n{:<40} {:>10.2f} ms {:>10.2f} ms  n^{:.2f}'.format(
+        'medial_step/circle/{}-{}'.format(*samples), times[0] * 1000, times[1] * 1000, exponent))
+    return exponent
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    print()
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        ratio = result['time'] / max(baseline[key]['time'], 1e-9)
+        memory = result['peak'] / max(baseline[key]['peak'], 1)
+        flag = ' <- slower' if ratio > tolerance else ''
+        print('{:<40} {:>6.2f}x time {:>6.2f}x memory{}'.format(key, ratio, memory, flag))
+        if ratio > tolerance:
+            regressions.append(key)
+    return regressions
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='benchmark the blob sketch and boolean pipelines')
+    parser.add_argument('--tiers', nargs='+', default=['small', 'medium'], choices=list(TIERS))
+    parser.add_argument('--shapes', nargs='+', default=list(SHAPES), choices=list(SHAPES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--save', help='write the results to this baseline file')
+    parser.add_argument('--compare', help='compare against this baseline file')
+    parser.add_argument('--tolerance', type=float, default=1.25, help='slowdown ratio counted as a regression')
+    parser.add_argument('--max-exponent', type=float, default=1.4, help='growth of the step search counted as a regression')
+    args = parser.parse_args(argv)
+
+    results = run(args.tiers, args.shapes, args.repeat)
+    exponent = scaling(args.repeat)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print('\n{} regressions'.format(len(regressions)))
+            return 1
+    if exponent > args.max_exponent:
+        print('\nmedial search grows faster than n^{}'.format(args.max_exponent))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else sys.argv[1:]
+    sys.exit(main(argv))
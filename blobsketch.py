@@ -1,209 +1,388 @@
 import bpy
-import bmesh
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from mathutils import Vector
-from mathutils.bvhtree import BVHTree
-from mathutils.kdtree import KDTree
 
-from . interact import InteractiveOperator, from_2d_to_3d_origin, from_3d_to_2d, from_2d_to_3d_normal, from_2d_to_3d, lerp, OperationFailed, scene_raycast
-from .register import register_class
+from . interact import InteractiveOperator, ViewProjection, SceneBVH, surface_points
+from .geometry import as_array, resample_loop, medial_search, delaunay_medial, MedialPreview, StrokeFilter
+from .mesher import polygonize_balls, blob_voxel, budget_voxel, mesh_from_arrays
+from . import timing
 
 
-@register_class
 class BlobSketch(InteractiveOperator):
-    bl_idname = 'base_tools.blobsketch'
-    bl_label = 'Blob Sketch'
-    bl_options = {'REGISTER', 'UNDO'}
+    # registered from operators.py
+    coalesce_events = True
+    batch_projection = None
+    executor = None
+    timer = None
 
     def loop(self, context):
-        points = []
+        stroke = StrokeFilter()
+        pending = []
+        jobs = []
         loop_color = (1, 0, 0, 1)
         close_loop_color = (0.5, 0.5, 0, 1)
+        pending_color = (0.3, 0.3, 0.3, 1)
+        preview_color = (0.2, 0.4, 1, 0.5)
+        background = context.scene.base_tools.blobsketch_background
+        preview = MedialPreview() if context.scene.base_tools.blobsketch_preview else None
+        surface = SceneBVH() if context.scene.base_tools.blobsketch_projection == 'SURFACE' else None
+        finishing = False
+
+        pending_layer = self.draw.layer('pending')
+        preview_layer = self.draw.circle_layer('preview', 12, preview_color)
+        stroke_layer = self.draw.layer('stroke')
+        live_layer = self.draw.layer('live')
 
         def draw():
             context.area.tag_redraw()
-            self.draw.clear()
-            self.draw.add_circle(self.mouse_co.xy, 6, 6, (0, 0, 0, 1))
-            for i in range(len(points) - 1):
-                p1 = points[i].xy
-                p2 = points[i + 1].xy
-                self.draw.add_line(p1, p2, loop_color)
-                if self.l_mouse:
-                    self.draw.add_line(points[0].xy, points[-1].xy, close_loop_color)
-                else:
-                    self.draw.add_line(points[0].xy, points[-1].xy, loop_color)
+            live_layer.clear()
+            live_layer.add_circle(self.mouse_co.xy, 6, 6, (0, 0, 0, 1))
+
+            # committed points never change, so the stroke layer only grows
+            stroke_layer.extend_polyline(stroke.points, loop_color)
+            points = stroke.polyline
+            if len(points) > 1:
+                if stroke.tail:
+                    live_layer.add_line(stroke.points[-1], stroke.tail, loop_color)
+                live_layer.add_line(points[-1], points[0], close_loop_color if self.l_mouse else loop_color)
 
             self.draw.update_batch()
 
+        def draw_pending():
+            pending_layer.clear()
+            for outline in pending + [outline for job, _ in jobs for outline in job.outlines]:
+                for p1, p2 in zip(outline, np.roll(outline, -1, axis=0)):
+                    pending_layer.add_line(p1, p2, pending_color)
+
+        def draw_preview():
+            # only the circles the last update recomputed are rewritten
+            updated = preview.updated
+            preview_layer.set(updated, preview.centers[updated], preview.radii[updated])
+
+        def advance_preview():
+            with timing.stage('preview'):
+                updated = preview.update()
+            if updated:
+                draw_preview()
+            return updated
+
         def add_point():
-            points.append(self.mouse_co)
-            points[-5:] = smooth_polyline(points[-5:])
+            for co in self.coalesced:
+                stroke.add(co)
+            if preview:
+                for point in stroke.points[preview.count:]:
+                    preview.add_point(point)
+                advance_preview()
+
+        def submit(outlines, projection):
+            job = BlobJob(outlines, context, projection, surface)
+            if background:
+                jobs.append((job, self.executor.submit(job.compute)))
+                draw_pending()
+            else:
+                job.compute()
+                job.finish(context)
+
+        def collect():
+            done = [item for item in jobs if item[1].done()]
+            for item in done:
+                jobs.remove(item)
+                job, future = item
+                future.result()
+                job.finish(context)
+                draw_pending()
+            return bool(done)
+
+        def cancel():
+            for job, future in jobs:
+                job.cancelled = True
+                future.cancel()
+            jobs.clear()
+            draw_pending()
+
+        def flush():
+            # every queued stroke goes into the same field, so overlapping strokes fuse
+            if pending:
+                outlines = pending[:]
+                pending.clear()
+                submit(outlines, self.batch_projection)
+                draw_pending()
 
         def confirm():
-            if not points:
+            nonlocal stroke, preview
+            if not stroke.points:
+                return
+            outline = as_array(stroke.polyline)
+            stroke = StrokeFilter()
+            stroke_layer.clear()
+            if preview:
+                preview = MedialPreview()
+                preview_layer.clear()
+
+            if not context.scene.base_tools.blobsketch_batch:
+                with timing.stage('confirm'):
+                    submit([outline], self.view_projection(context))
                 return
-            resampled = resample_loop(points, context.scene.base_tools.blobsketch_quality)
-            medial = medial_approx(list(resampled))
-            create_blob(list(medial), context)
-            points.clear()
 
-        event = yield {'RUNNING_MODAL'}
-        while True:
-            draw()
+            # queued outlines are in screen space, so a batch keeps the view it was drawn in
+            # and is placed with it, even when the view has moved on by the time it is flushed
+            projection = self.view_projection(context)
+            if pending and projection is not self.batch_projection:
+                flush()
+            self.batch_projection = projection
+            pending.append(outline)
+            draw_pending()
 
-            if self.l_mouse and event.type == 'MOUSEMOVE':
-                add_point()
-                event = yield {'RUNNING_MODAL'}
+        if background:
+            self.executor = ThreadPoolExecutor(max_workers=1)
+            self.timer = context.window_manager.event_timer_add(0.05, window=context.window)
 
-            if event.type == 'LEFTMOUSE' and self.release:
-                confirm()
-                event = yield {'RUNNING_MODAL'}
+        try:
+            draw()
+            event = yield {'RUNNING_MODAL'}
+            while True:
+                # every event is handled in one pass, timers only redraw when a job landed
+                # or the preview, still catching up while the mouse rests, changed circles
+                ret = {'PASS_THROUGH'}
+                dirty = event.type != 'TIMER'
+
+                if event.type == 'TIMER':
+                    if preview and preview.busy:
+                        dirty = advance_preview()
+                    if background:
+                        dirty = collect() or dirty
+                        if finishing and not jobs:
+                            return {'FINISHED'}
+
+                elif self.l_mouse and event.type == 'MOUSEMOVE':
+                    add_point()
+                    ret = {'RUNNING_MODAL'}
+
+                elif event.type == 'LEFTMOUSE' and self.release:
+                    confirm()
+                    ret = {'RUNNING_MODAL'}
+
+                elif event.type == 'ESC' and event.value == 'PRESS':
+                    # the first ESC drops blobs still computing, the next one leaves the tool
+                    if jobs:
+                        cancel()
+                        finishing = False
+                    else:
+                        flush()
+                        if not jobs:
+                            return {'FINISHED'}
+                        finishing = True
+
+                if dirty:
+                    draw()
+                event = yield ret
+
+        finally:
+            if surface:
+                surface.free()
+            if background:
+                cancel()
+                self.executor.shutdown(wait=False)
+                context.window_manager.event_timer_remove(self.timer)
+
+
+class BlobFrame:
+    # view dependent values, captured on the main thread when a stroke is confirmed
+    def __init__(self, context, projection=None, surface=None, outlines=()):
+        projection = projection or ViewProjection(context)
+        plane_co = context.scene.cursor.location
+        self.trees = None
+        if surface is not None:
+            # the blob is anchored where the stroke lands on the surface
+            self.trees = surface.get(context)
+            hits = surface_points(self.trees, projection, np.concatenate(outlines))
+            hit = ~np.isnan(hits[:, 0])
+            if hit.any():
+                plane_co = Vector(hits[hit].mean(axis=0))
+
+        plane_co, plane_no, size = get_cursor_plane(context, projection, plane_co)
+        self.projection = projection
+        self.location = plane_co.copy()
+        self.rotation = projection.view_rotation.copy()
+        self.matrix = np.array(self.rotation.to_matrix())
+        self.cursor_2d = projection.to_2d(plane_co)[0]
+        self.cursor_2d_pos = Vector((self.cursor_2d[0], self.cursor_2d[1], 0))
+        self.size = size
+        self.resolution = context.scene.base_tools.blobsketch_resoluition
+        self.budget = context.scene.base_tools.blobsketch_budget
+        self.reduce = context.scene.base_tools.blobsketch_reduce
+
+    def local(self, centers, radii):
+        # screen space circles into the blob object's space, in one go for the whole stroke
+        if not self.trees:
+            centers = np.column_stack((centers - self.cursor_2d, np.zeros(len(centers)))) * self.size
+            return centers, radii * self.size
+
+        # on a surface every circle goes where its pixel lands, or onto the frame's plane
+        # when it misses, keeping its size in pixels at that depth
+        world = surface_points(self.trees, self.projection, centers)
+        miss = np.isnan(world[:, 0])
+        world[miss] = self.projection.to_3d(centers[miss], self.location)
+        edge = self.projection.to_3d(centers + (0, 1), world)
+        sizes = np.sqrt(((edge - world) ** 2).sum(axis=1))
+        return (world - np.array(self.location)) @ self.matrix, radii * sizes
+
+
+class BlobJob:
+    def __init__(self, outlines, context, projection=None, surface=None):
+        settings = context.scene.base_tools
+        self.outlines = outlines
+        self.quality = settings.blobsketch_quality
+        self.adaptive = settings.blobsketch_adaptive
+        self.medial = settings.blobsketch_medial
+        self.native = settings.blobsketch_mesher == 'NATIVE'
+        self.frame = BlobFrame(context, projection, surface, outlines)
+        self.cancelled = False
+        self.circles = None
+        self.mesh = None
+
+    def compute(self):
+        # only plain arrays in here, it may run on a worker thread
+        centers = []
+        radii = []
+        for outline in self.outlines:
+            if self.cancelled:
+                return
+            c, r = stroke_medial(outline, self.quality, self.adaptive, self.medial)
+            centers.append(c)
+            radii.append(r)
+
+        self.circles = np.concatenate(centers), np.concatenate(radii)
+        timing.count('samples', self.quality * len(self.outlines))
+        timing.count('circles', len(self.circles[1]))
+        if self.native and not self.cancelled:
+            with timing.stage('mesher'):
+                self.mesh = blob_mesh_arrays(*self.circles, self.frame)
+            timing.count('verts', len(self.mesh[0]))
+            timing.count('faces', len(self.mesh[1]))
+
+    def finish(self, context):
+        if self.cancelled or not len(self.circles[1]):
+            return
+
+        if self.native:
+            create_blob_mesh(*self.mesh, context, self.frame)
+        else:
+            create_blob(*self.circles, context, self.frame)
 
-            if event.type == 'ESC':
-                return {'FINISHED'}
 
-            event = yield {'PASS_THROUGH'}
+def stroke_medial(outline, quality, adaptive=0, medial='STEP'):
+    with timing.stage('resample'):
+        resampled = resample_loop(outline, quality, adaptive)
+    with timing.stage('medial'):
+        if medial == 'DELAUNAY':
+            return delaunay_medial(resampled)
+        return medial_search(resampled)
 
 
-def create_blob(circles, context):
-    plane_co, plane_no, size = get_cursor_plane(context)
-    cursor_2d_pos = from_3d_to_2d(context.scene.cursor.location, context).to_3d()
-    rotation = context.region_data.view_rotation
-    bpy.ops.object.metaball_add()
+def create_blob(centers, radii, context, frame=None):
+    if frame is None:
+        frame = BlobFrame(context)
+    centers, radii = frame.local(as_array(centers), np.asarray(radii, dtype=np.float64))
+    bpy.ops.object.metaball_add(location=frame.location)
     meta = context.active_object
     meta.rotation_mode = 'QUATERNION'
-    meta.rotation_quaternion = rotation
+    meta.rotation_quaternion = frame.rotation
     meta.data.threshold = 0.01
     meta.data.elements.remove(meta.data.elements[0])
 
-    min_bound = Vector((float('inf'),) * 3)
-    max_bound = Vector((float('-inf'),) * 3)
-
-    for pt, radius in circles:
-        elem = meta.data.elements.new()
-        elem.co = (pt - cursor_2d_pos) * size
-        min_bound = Vector(map(min, zip(min_bound, elem.co - Vector((size * radius,) * 3))))
-        max_bound = Vector(map(max, zip(min_bound, elem.co + Vector((size * radius,) * 3))))
-        elem.radius = radius * size
+    with timing.stage('metaball elements'):
+        # elements can only be added one at a time, their values are written in bulk
+        elements = meta.data.elements
+        new = elements.new
+        for _ in range(len(radii)):
+            new()
+        elements.foreach_set('co', np.ascontiguousarray(centers, dtype=np.float32).ravel())
+        elements.foreach_set('radius', np.ascontiguousarray(radii, dtype=np.float32))
 
     for obj in context.selected_objects:
         obj.select_set(False)
 
     meta.select_set(True)
     context.view_layer.objects.active = meta
-    meta.data.resolution = min(max_bound.xy - min_bound.xy) / context.scene.base_tools.blobsketch_resoluition
-    bpy.ops.object.convert(target='MESH')
-
-
-def smooth_polyline(points):
-    yield points[0]
-    for i in range(1, len(points) - 1):
-        yield (points[i - 1] + points[i + 1]) / 2
-    yield points[-1]
-
-
-def kd_from_points(points):
-    tree = KDTree(len(points))
-    for i, p in enumerate(points):
-        tree.insert(p, i)
-    tree.balance()
-    return tree
+    meta.data.resolution = frame_voxel(centers, radii, frame)
+    with timing.stage('convert'):
+        bpy.ops.object.convert(target='MESH')
+    if frame.reduce:
+        reduce_to_budget(context.active_object, frame.budget, context)
+    if timing.profiler:
+        timing.count('verts', len(context.active_object.data.vertices))
+        timing.count('faces', len(context.active_object.data.polygons))
+
+
+def blob_mesh_arrays(centers, radii, frame):
+    centers, radii = frame.local(centers, radii)
+    return polygonize_balls(centers, radii, frame_voxel(centers, radii, frame), threshold=0.01)
+
+
+def frame_voxel(centers, radii, frame):
+    if frame.budget:
+        with timing.stage('budget'):
+            return budget_voxel(centers, radii, frame.budget)
+    return blob_voxel(centers, radii, frame.resolution)
+
+
+def reduce_to_budget(ob, budget, context):
+    # the predicted resolution lands near the budget, this catches what still overshoots
+    faces = len(ob.data.polygons)
+    if not budget or faces <= budget:
+        return
+    with timing.stage('reduce'):
+        md = ob.modifiers.new(type='DECIMATE', name='budget')
+        md.ratio = budget / faces
+        depsgraph = context.evaluated_depsgraph_get()
+        mesh = bpy.data.meshes.new_from_object(ob.evaluated_get(depsgraph))
+        ob.modifiers.remove(md)
+        old = ob.data
+        ob.data = mesh
+        bpy.data.meshes.remove(old)
+        mesh.name = 'Blob'
+    if timing.profiler:
+        timing.count('verts', len(mesh.vertices))
+        timing.count('faces', len(mesh.polygons))
+
+
+def create_blob_mesh(verts, faces, context, frame):
+    with timing.stage('mesh write'):
+        mesh = mesh_from_arrays('Blob', verts, faces)
+    obj = bpy.data.objects.new('Blob', mesh)
+    obj.location = frame.location
+    obj.rotation_mode = 'QUATERNION'
+    obj.rotation_quaternion = frame.rotation
+    context.collection.objects.link(obj)
+
+    for ob in context.selected_objects:
+        ob.select_set(False)
+
+    obj.select_set(True)
+    context.view_layer.objects.active = obj
+    if frame.reduce:
+        reduce_to_budget(obj, frame.budget, context)
 
 
 class CursorOutOfScreen(Exception):
     pass
 
 
-def get_cursor_plane(context):
-    plane_co = context.scene.cursor.location
-    plane_no = context.region_data.view_rotation @ Vector((0, 0, 1))
-    cursor_2d_pos = from_3d_to_2d(context.scene.cursor.location, context)
-    if cursor_2d_pos is None:
+def get_cursor_plane(context, projection=None, plane_co=None):
+    projection = projection or ViewProjection(context)
+    if plane_co is None:
+        plane_co = context.scene.cursor.location
+    plane_no = projection.view_rotation @ Vector((0, 0, 1))
+    cursor_2d_pos = projection.to_2d(plane_co)[0]
+    if np.isnan(cursor_2d_pos).any():
         raise CursorOutOfScreen
 
-    pixel_size = (from_2d_to_3d(cursor_2d_pos + Vector((0, 100)), context, plane_co) - plane_co).length / 100
+    edge = projection.to_3d(cursor_2d_pos + (0, 100), plane_co)[0]
+    pixel_size = np.sqrt(((edge - plane_co) ** 2).sum()) / 100
 
     return plane_co, plane_no, pixel_size
 
 
-def resample_loop(points, n):
-    segments = []
-    lengths = []
-    for p1, p2 in loop_segments_iter(points):
-        segments.append((p1, p2))
-        lengths.append((p1 - p2).length)
-
-    tot_length = sum(lengths)
-
-    step = tot_length / n
-
-    curr_length_down = 0
-    curr_length_up = 0
-    curr_pos = 0
-
-    while segments:
-        segment = segments.pop(-1)
-        length = lengths.pop(-1)
-        curr_length_up += length
-        while curr_pos < curr_length_up:
-            t = (curr_pos - curr_length_down) / length
-            yield lerp(segment[1], segment[0], t)
-            curr_pos += step
-        curr_length_down = curr_length_up
-
-
-def loop_segments_iter(points):
-    n = len(points)
-    for i in range(n):
-        yield points[i], points[(i + 1) % n]
-
-
-def medial_approx(points_loop, precision=0.001):
-    kd = kd_from_points(points_loop)
-    bm = bmesh.new()
-    verts = [bm.verts.new(v) for v in points_loop]
-    face = bm.faces.new(verts)
-    bmesh.ops.recalc_face_normals(bm, faces=bm.faces)
-    normal = face.normal
-    bmesh.ops.triangulate(bm, faces=bm.faces)
-    bvh = BVHTree.FromBMesh(bm)
-
-    def radius(pt):
-        result, _, _, _ = bvh.ray_cast(pt + normal, -normal)
-        if result:
-            return kd.find(pt)[2]
-        else:
-            return 0
-
-    for vert in bm.verts:
-        if not vert.is_boundary:
-            continue
-        mid = vert.co
-        evec = Vector()
-        for edge in vert.link_edges:
-            if edge.is_boundary:
-                evec += (edge.verts[0].co - edge.verts[1].co).cross(edge.link_faces[0].normal)
-
-        size = precision
-        last_size = size
-        incr = 2
-        scr = radius(mid + evec * size)
-
-        cap = 1 + precision
-        while incr > cap:
-            pt = mid + evec * size * incr
-            scr1 = radius(pt)
-            if scr1 > scr:
-                scr = scr1
-                last_size = size
-                size *= incr
-                continue
-
-            else:
-                incr = (incr + 1) / 2
-                size = last_size
-                scr = radius(mid + evec * size)
-
-        yield mid + evec * size, scr
-
-
 classes = [BlobSketch]
@@ -1,55 +1,275 @@
 import bpy
 import bmesh
+import numpy as np
 from bpy import context
-from . register import register_class
+from mathutils import Vector
+from mathutils.bvhtree import BVHTree
+from .geometry import loose_parts
+from .voxel import voxel_boolean
+from .mesher import mesh_from_arrays
+from . import timing
 
 
 def bool_apply_objs(obj1, obj2, operation):
-    md = obj1.modifiers.new(type='BOOLEAN', name='bool')
-    md.operation = operation
-    md.object = obj2
-    old_active = bpy.context.active_object
-    bpy.context.view_layer.objects.active = obj1
-    bpy.ops.object.modifier_apply(modifier=md.name)
-    bpy.context.view_layer.objects.active = old_active
+    bool_apply([obj1], obj2, operation)
 
 
-def remove_ngons(ob):
+def bool_apply(targets, cutter, operation):
+    bool_apply_pairs([(ob, cutter) for ob in targets], operation)
+
+
+def bool_apply_pairs(pairs, operation):
+    # every target gets its modifier first, so one depsgraph evaluation covers the batch,
+    # the other modifiers are muted meanwhile, like modifier_apply only applying this one
+    if not pairs:
+        return
+    targets = [ob for ob, _ in pairs]
+    muted = []
+    mods = []
+    for ob, cutter in pairs:
+        for md in ob.modifiers:
+            if md.show_viewport:
+                md.show_viewport = False
+                muted.append(md)
+        md = ob.modifiers.new(type='BOOLEAN', name='bool')
+        md.operation = operation
+        md.object = cutter
+        mods.append(md)
+
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    meshes = [bpy.data.meshes.new_from_object(ob.evaluated_get(depsgraph)) for ob in targets]
+
+    for ob, md, mesh in zip(targets, mods, meshes):
+        ob.modifiers.remove(md)
+        replace_mesh(ob, mesh)
+    for md in muted:
+        md.show_viewport = True
+
+
+def replace_mesh(ob, mesh):
+    old = ob.data
+    name = old.name
+    ob.data = mesh
+    if not old.users:
+        bpy.data.meshes.remove(old)
+        mesh.name = name
+
+
+def empty_mesh(ob):
+    # a new mesh rather than clearing the old one, which linked duplicates may share
+    mesh = bpy.data.meshes.new(ob.data.name)
+    for material in ob.data.materials:
+        mesh.materials.append(material)
+    replace_mesh(ob, mesh)
+
+
+def remove_object(ob):
+    mesh = ob.data
+    bpy.data.objects.remove(ob)
+    if not mesh.users:
+        bpy.data.meshes.remove(mesh)
+
+
+def world_bounds(ob):
+    corners = np.array([ob.matrix_world @ Vector(corner) for corner in ob.bound_box])
+    return corners.min(axis=0), corners.max(axis=0)
+
+
+def base_bounds(ob):
+    # bound_box follows the evaluated mesh, the booleans work on the base one
+    co = read_array(ob.data.vertices, 'co', 3, np.float32)
+    if not len(co):
+        return np.full(3, np.inf), np.full(3, -np.inf)
+    mat = np.array(ob.matrix_world)
+    co = co @ mat[:3, :3].T + mat[:3, 3]
+    return co.min(axis=0), co.max(axis=0)
+
+
+def bounds_overlap(a, b):
+    return (a[0] <= b[1]).all() and (b[0] <= a[1]).all()
+
+
+def bounds_contain(a, b):
+    return (a[0] <= b[0]).all() and (b[1] <= a[1]).all()
+
+
+def world_triangles(ob, depsgraph=None):
+    # the evaluated mesh when given a depsgraph, like the boolean modifier sees cutters
+    ob_eval = ob.evaluated_get(depsgraph) if depsgraph else ob
+    mesh = ob_eval.to_mesh() if depsgraph else ob.data
+    mesh.calc_loop_triangles()
+    co = read_array(mesh.vertices, 'co', 3, np.float32)
+    tris = read_array(mesh.loop_triangles, 'vertices', 3, np.int32)
+    if depsgraph:
+        ob_eval.to_mesh_clear()
+
+    mat = np.array(ob.matrix_world)
+    return co @ mat[:3, :3].T + mat[:3, 3], tris
+
+
+def base_bvh(ob, space):
+    # the base mesh moved into another object's space by bmesh, so the triangles
+    # never go through python lists
     bm = bmesh.new()
     bm.from_mesh(ob.data)
-    faces = [f for f in bm.faces if len(f.verts) > 4]
-    bmesh.ops.triangulate(bm, faces=faces)
-    bm.to_mesh(ob.data)
+    bm.transform(space.matrix_world.inverted() @ ob.matrix_world)
+    tree = BVHTree.FromBMesh(bm)
+    bm.free()
+    return tree
 
 
-@register_class
-class Boolean(bpy.types.Operator):
-    bl_idname = 'base_tools.boolean'
-    bl_label = 'Boolean'
-    bl_options = {'REGISTER', 'UNDO'}
-
-    operation: bpy.props.EnumProperty(
-        name='Operation',
-        items=[
-            ('UNION', 'union', 'union'),
-            ('DIFFERENCE', 'difference', 'difference'),
-            ('INTERSECT', 'intersect', 'intersect'),
-            ('SLICE', 'slice', 'cut objects using active as knife')
-        ]
-    )
-
-    remove: bpy.props.BoolProperty(
-        name='remove',
-        description='Remove active object after operation',
-        default=True
-    )
-
-    ngons: bpy.props.BoolProperty(
-        name='ngons',
-        description='allow ngons in mesh',
-        default=True
-    )
+def voxel_result(ob, co, faces):
+    # the polygonized result goes back into the object's own space
+    mat = np.array(ob.matrix_world.inverted())
+    mesh = mesh_from_arrays(ob.data.name, co @ mat[:3, :3].T + mat[:3, 3], faces)
+    for material in ob.data.materials:
+        mesh.materials.append(material)
+    replace_mesh(ob, mesh)
+
+
+def voxel_apply(targets, cutter, operation, voxel_size, workers=1):
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    cutter_mesh = world_triangles(cutter, depsgraph)
+    for ob in targets:
+        co, faces = voxel_boolean([world_triangles(ob), cutter_mesh], operation, voxel_size, workers=workers)
+        voxel_result(ob, co, faces)
+
+
+def voxel_merge(objects, voxel_size, workers=1):
+    co, faces = voxel_boolean([world_triangles(ob) for ob in objects], 'UNION', voxel_size, workers=workers)
+    voxel_result(objects[0], co, faces)
+    for ob in objects[1:]:
+        remove_object(ob)
+    return objects[0]
+
+
+def cull_targets(targets, cutter):
+    # the cutter can only change targets whose surface it touches, or ones nested
+    # with it, which only shows as one bounding box holding the other. targets are
+    # tested with their base mesh, which is what the boolean consumes, the cutter
+    # with its evaluated one, like the modifier sees it
+    cutter_bounds = world_bounds(cutter)
+    bounds = [base_bounds(ob) for ob in targets]
+    near = [(ob, b) for ob, b in zip(targets, bounds) if bounds_overlap(b, cutter_bounds)]
+    if not near:
+        return []
+
+    # the cutter's tree stays in its own space, the targets are moved into it
+    cutter_tree = BVHTree.FromObject(cutter, bpy.context.evaluated_depsgraph_get())
+    return [ob for ob, b in near
+            if bounds_contain(b, cutter_bounds) or bounds_contain(cutter_bounds, b) or
+            base_bvh(ob, cutter).overlap(cutter_tree)]
 
+
+def union_tree(objects):
+    # neighbours are merged level by level, n parts cost log n rounds of similar sized
+    # booleans instead of n ever growing ones, the first object is the one that remains
+    centers = np.array([sum(world_bounds(ob)) / 2 for ob in objects])
+    axis = np.argmax(np.ptp(centers, axis=0))
+    order = np.argsort(centers[1:, axis], kind='stable') + 1
+    objects = objects[:1] + [objects[i] for i in order]
+
+    while len(objects) > 1:
+        pairs = list(zip(objects[::2], objects[1::2]))
+        bool_apply_pairs(pairs, 'UNION')
+        for _, ob in pairs:
+            remove_object(ob)
+        objects = objects[::2]
+    return objects[0]
+
+
+def read_array(seq, attr, width, dtype):
+    data = np.empty(len(seq) * width, dtype=dtype)
+    seq.foreach_get(attr, data)
+    return data.reshape(-1, width) if width > 1 else data
+
+
+def delete_verts(bm, drop):
+    if drop.any():
+        bmesh.ops.delete(bm, geom=[v for v, d in zip(bm.verts, drop.tolist()) if d], context='VERTS')
+
+
+def split_parts(bm, labels, parts, source, meshes):
+    # halves the set of parts with a bmesh copy each time, so a mesh is copied log(parts)
+    # times; bmesh keeps vertex order through copy and delete, so labels follow by masking
+    if len(parts) > 1:
+        keep = np.isin(labels, parts[:len(parts) // 2])
+        other = bm.copy()
+        delete_verts(bm, ~keep)
+        delete_verts(other, keep)
+        split_parts(bm, labels[keep], parts[:len(parts) // 2], source, meshes)
+        split_parts(other, labels[~keep], parts[len(parts) // 2:], source, meshes)
+        return
+
+    # vertices of parts without faces are dropped; the first part goes back into the
+    # source mesh, the others into copies of it made once it holds only that part
+    delete_verts(bm, labels != parts[0])
+    part_mesh = source.copy() if meshes else source
+    bm.to_mesh(part_mesh)
+    bm.free()
+    meshes.append(part_mesh)
+
+
+def separate_loose(ob):
+    # parts come from a union find over the edge array, the split itself goes through
+    # bmesh so vertex groups, shape keys, colors, masks, seams and custom normals survive
+    mesh = ob.data
+    edges = read_array(mesh.edges, 'vertices', 2, np.int32).astype(np.int64)
+    labels, count = loose_parts(len(mesh.vertices), edges)
+    if count < 2:
+        return [ob]
+
+    loop_start = read_array(mesh.polygons, 'loop_start', 1, np.int32)
+    loop_verts = read_array(mesh.loops, 'vertex_index', 1, np.int32)
+    parts = np.unique(labels[loop_verts[loop_start]])
+    if len(parts) < 2:
+        return [ob]
+
+    source = mesh if mesh.users == 1 else mesh.copy()
+    bm = bmesh.new()
+    bm.from_mesh(mesh)
+    meshes = []
+    split_parts(bm, labels, parts, source, meshes)
+    if source is not mesh:
+        replace_mesh(ob, source)
+
+    # the object keeps the first part, the others go into copies of it
+    objects = [ob]
+    for part_mesh in meshes[1:]:
+        part_ob = ob.copy()
+        part_ob.data = part_mesh
+        for collection in ob.users_collection:
+            collection.objects.link(part_ob)
+        part_ob.select_set(ob.select_get())
+        objects.append(part_ob)
+    return objects
+
+
+def remove_ngons(ob):
+    # polygon sizes come in one bulk read, meshes without ngons are never touched
+    mesh = ob.data
+    sizes = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get('loop_total', sizes)
+    ngons = np.flatnonzero(sizes > 4)
+    if not len(ngons):
+        return
+
+    bm = bmesh.new()
+    bm.from_mesh(mesh)
+    bm.faces.ensure_lookup_table()
+    bmesh.ops.triangulate(bm, faces=[bm.faces[i] for i in ngons.tolist()])
+    bm.to_mesh(mesh)
+    bm.free()
+
+
+def count_result(objects):
+    if timing.profiler:
+        timing.count('verts', sum(len(ob.data.vertices) for ob in objects))
+        timing.count('faces', sum(len(ob.data.polygons) for ob in objects))
+
+
+class Boolean(bpy.types.Operator):
+    # registered from operators.py, which holds the properties
     def execute(self, context):
         meshes = [ob for ob in context.selected_objects if ob.type == 'MESH']
 
@@ -64,28 +284,52 @@ class Boolean(bpy.types.Operator):
         active = context.active_object
         targets = [ob for ob in meshes if ob is not active]
 
-        if not self.operation == 'SLICE':
-            for ob in targets:
-                bool_apply_objs(ob, active, self.operation)
-                if not self.ngons:
-                    remove_ngons(ob)
-        else:
+        voxel = self.backend == 'VOXEL' and self.operation != 'SLICE'
+
+        if self.operation == 'MERGE':
+            with timing.stage('merge'):
+                if voxel:
+                    result = voxel_merge([active] + targets, self.voxel_size, self.workers)
+                else:
+                    result = union_tree([active] + targets)
+            if not self.ngons:
+                with timing.stage('ngons'):
+                    remove_ngons(result)
+            count_result([result])
+            return {'FINISHED'}
+
+        operation = self.operation
+        if operation == 'SLICE':
             thicc = active.modifiers.new(type='SOLIDIFY', name='solid')
             thicc.thickness = 0.00001
-            for ob in targets:
-                bool_apply_objs(ob, active, 'DIFFERENCE')
-                if not self.ngons:
-                    remove_ngons(ob)
+            operation = 'DIFFERENCE'
+
+        with timing.stage('cull'):
+            if operation == 'INTERSECT':
+                hit = cull_targets(targets, active)
+                for ob in targets:
+                    if ob not in hit:
+                        empty_mesh(ob)
+                targets = hit
+            elif operation == 'DIFFERENCE':
+                targets = cull_targets(targets, active)
+        timing.count('targets', len(targets))
 
-            active.select_set(False)
-            context.view_layer.objects.active = ob
-            bpy.ops.object.mode_set(mode='EDIT')
-            bpy.ops.mesh.select_all(action='SELECT')
-            bpy.ops.mesh.separate(type='LOOSE')
-            bpy.ops.object.mode_set(mode='OBJECT')
-            active.select_set(True)
-            context.view_layer.objects.active = active
+        with timing.stage('boolean'):
+            if voxel:
+                voxel_apply(targets, active, operation, self.voxel_size, self.workers)
+            else:
+                bool_apply(targets, active, operation)
+        if not self.ngons:
+            with timing.stage('ngons'):
+                for ob in targets:
+                    remove_ngons(ob)
 
+        if self.operation == 'SLICE':
+            with timing.stage('separate'):
+                for ob in targets:
+                    separate_loose(ob)
+        count_result(targets)
 
         if self.remove:
             bpy.data.objects.remove(active)
@@ -1,9 +1,11 @@
 import bpy
+import numpy as np
 from mathutils import Vector
 import gpu
 import bgl
 from gpu_extras import batch
 from math import cos, sin, pi
+from functools import lru_cache
 import blf
 
 def lerp(a, b, t):
@@ -15,57 +17,175 @@ def circle_point(center=(0, 0), radius=1, t=0):
     return Vector((center[0] + sin(t) * radius, center[1] + cos(t) * radius))
 
 
-class Draw2D:
-    def __init__(self):
+@lru_cache(maxsize=None)
+def circle_template(resolution):
+    return [circle_point(t=i / resolution) for i in range(resolution + 1)]
+
+
+class Layer:
+    # lines are uploaded in sealed batches of `chunk` lines plus an open tail,
+    # so appending to a long layer only re-uploads the tail
+    chunk = 256
+
+    def __init__(self, shader):
+        self.shader = shader
         self.vertices = []
         self.colors = []
+        self.sealed = []
+        self.batch = None
+        self.dirty = False
+        self.polyline_len = 0
+
+    def add_line(self, point_a, point_b, color_a=(1, 0, 0, 1), color_b=None):
+        self.dirty = True
+        self.vertices.append(point_a)
+        self.vertices.append(point_b)
+        self.colors.append(color_a)
+        self.colors.append(color_b if color_b else color_a)
+        if len(self.vertices) >= 2 * self.chunk:
+            self.sealed.append(self.make_batch())
+            self.vertices = []
+            self.colors = []
+
+    def add_circle(self, center, radius, resolution, color=(1, 0, 0, 1)):
+        cx, cy = center[0], center[1]
+        points = [(cx + p.x * radius, cy + p.y * radius) for p in circle_template(resolution)]
+        for point_a, point_b in zip(points, points[1:]):
+            self.add_line(point_a, point_b, color)
+
+    def extend_polyline(self, points, color=(1, 0, 0, 1)):
+        # only the segments added since the last call are appended
+        start = max(self.polyline_len - 1, 0)
+        for point_a, point_b in zip(points[start:], points[start + 1:]):
+            self.add_line(point_a, point_b, color)
+        self.polyline_len = len(points)
+
+    def remove_last_line(self):
+        if self.vertices:
+            self.dirty = True
+            del self.vertices[-2:]
+            del self.colors[-2:]
+
+    def clear(self):
+        self.dirty = True
+        self.vertices.clear()
+        self.colors.clear()
+        self.sealed.clear()
+        self.polyline_len = 0
+
+    def make_batch(self):
+        return batch.batch_for_shader(self.shader, "LINES", {"pos": self.vertices, "color": self.colors})
+
+    def update_batch(self):
+        if self.dirty:
+            self.dirty = False
+            self.batch = self.make_batch() if self.vertices else None
+
+    def draw(self):
+        self.update_batch()
+        for sealed in self.sealed:
+            sealed.draw(self.shader)
+        if self.batch:
+            self.batch.draw(self.shader)
+
+
+class CircleLayer:
+    # every circle owns a fixed run of lines, so changed circles are rewritten in place
+    # and only the chunks holding them are uploaded again
+    chunk = 128
+
+    def __init__(self, shader, resolution=12, color=(1, 0, 0, 1)):
+        self.shader = shader
+        ring = np.array([tuple(p) for p in circle_template(resolution)], dtype=np.float32)
+        self.ring = np.stack((ring[:-1], ring[1:]), axis=1).reshape(-1, 2)
+        self.colors = np.tile(np.array(color, dtype=np.float32), (len(self.ring) * self.chunk, 1))
+        self.vertices = np.zeros((0, len(self.ring), 2), dtype=np.float32)
+        self.batches = []
+        self.dirty = set()
+
+    def set(self, index, centers, radii):
+        # circles without a radius are parked off screen
+        index = np.asarray(index, dtype=np.int64)
+        if not len(index):
+            return
+        if index.max() >= len(self.vertices):
+            grown = np.full((index.max() + 1, len(self.ring), 2), -1e6, dtype=np.float32)
+            grown[:len(self.vertices)] = self.vertices
+            self.vertices = grown
+        radii = np.asarray(radii, dtype=np.float32)
+        verts = np.asarray(centers, dtype=np.float32)[:, None, :2] + self.ring[None] * radii[:, None, None]
+        verts[radii <= 0] = -1e6
+        self.vertices[index] = verts
+        self.dirty.update(np.unique(index // self.chunk).tolist())
+
+    def clear(self):
+        self.vertices = self.vertices[:0]
+        self.batches.clear()
+        self.dirty.clear()
+
+    def update_batch(self):
+        chunks = (len(self.vertices) + self.chunk - 1) // self.chunk
+        self.batches += [None] * (chunks - len(self.batches))
+        for i in self.dirty:
+            verts = self.vertices[i * self.chunk:(i + 1) * self.chunk].reshape(-1, 2)
+            self.batches[i] = batch.batch_for_shader(self.shader, "LINES",
+                                                     {"pos": verts, "color": self.colors[:len(verts)]})
+        self.dirty.clear()
+
+    def draw(self):
+        self.update_batch()
+        for chunk in self.batches:
+            if chunk is not None:
+                chunk.draw(self.shader)
+
+
+class Draw2D:
+    def __init__(self):
+        self.layers = {}
         self.text = []
+        self.overlay = []
         self.thickness = 2
         self.font_shadow = (0, 0, 0, 0.5)
         self.shader = gpu.shader.from_builtin("2D_FLAT_COLOR")
-        self.batch_redraw = False
-        self.batch = None
         self.handler = None
 
     def __call__(self):
         self.draw()
 
+    def layer(self, name='default'):
+        # layers draw in the order they were first asked for
+        if name not in self.layers:
+            self.layers[name] = Layer(self.shader)
+        return self.layers[name]
+
+    def circle_layer(self, name, resolution=12, color=(1, 0, 0, 1)):
+        if name not in self.layers:
+            self.layers[name] = CircleLayer(self.shader, resolution, color)
+        return self.layers[name]
+
     def add_text(self, text, location, size, color=(0, 0, 0, 1), dpi=72):
         self.text.append((text, location, size, color, dpi))
 
     def add_circle(self, center, radius, resolution, color=(1, 0, 0, 1)):
-        self.batch_redraw = True
-        for i in range(resolution):
-            line_point_a = circle_point(center, radius, i / resolution)
-            line_point_b = circle_point(center, radius, (i + 1) / resolution)
-            self.add_line(line_point_a, line_point_b, color)
+        self.layer().add_circle(center, radius, resolution, color)
 
     def add_line(self, point_a, point_b, color_a=(1, 0, 0, 1), color_b=None):
-        self.batch_redraw = True
-        self.vertices.append(point_a)
-        self.vertices.append(point_b)
-        self.colors.append(color_a)
-        self.colors.append(color_b if color_b else color_a)
+        self.layer().add_line(point_a, point_b, color_a, color_b)
 
     def remove_last_line(self):
-        self.batch_redraw = True
-        self.vertices.pop(-1)
-        self.vertices.pop(-1)
+        self.layer().remove_last_line()
 
     def remove_last_text(self):
-        self.batch_redraw = True
         self.text.pop(-1)
 
     def clear(self):
-        self.batch_redraw = True
-        self.vertices.clear()
-        self.colors.clear()
+        for layer in self.layers.values():
+            layer.clear()
         self.text.clear()
 
     def update_batch(self):
-        self.batch_redraw = False
-        self.batch = batch.batch_for_shader(self.shader, "LINES",
-                                            {"pos": self.vertices, "color": self.colors})
+        for layer in self.layers.values():
+            layer.update_batch()
 
     def setup_handler(self):
         self.handler = bpy.types.SpaceView3D.draw_handler_add(self, (), "WINDOW", "POST_PIXEL")
@@ -75,11 +195,10 @@ class Draw2D:
 
     def draw(self):
         bgl.glEnable(bgl.GL_BLEND)
-        if self.batch_redraw or not self.batch:
-            self.update_batch()
         bgl.glLineWidth(self.thickness)
         self.shader.bind()
-        self.batch.draw(self.shader)
+        for layer in self.layers.values():
+            layer.draw()
         bgl.glLineWidth(1)
 
         for text, location, size, color, dpi in self.text:
@@ -89,6 +208,14 @@ class Draw2D:
             blf.shadow(0, 3, *self.font_shadow)
             blf.draw(0, text)
 
+        if self.overlay:
+            top = bpy.context.region.height - 40
+            blf.size(0, 12, 72)
+            blf.color(0, 1, 1, 1, 1)
+            for i, line in enumerate(self.overlay):
+                blf.position(0, 20, top - 16 * i, 0)
+                blf.draw(0, line)
+
         bgl.glDisable(bgl.GL_BLEND)
 
 
@@ -0,0 +1,607 @@
+import numpy as np
+from math import asin, atan2, hypot, pi
+from time import perf_counter
+
+
+def as_array(points):
+    if isinstance(points, np.ndarray):
+        return points[:, :2]
+    return np.array([p[:2] for p in points], dtype=np.float64).reshape(-1, 2)
+
+
+def loop_edges(loop):
+    return loop, np.roll(loop, -1, axis=0)
+
+
+def signed_area(loop):
+    a, b = loop_edges(loop)
+    return (a[:, 0] * b[:, 1] - b[:, 0] * a[:, 1]).sum() / 2
+
+
+def inward_vectors(loop):
+    # sum of the inward edge normals around each vertex, scaled by edge length
+    a, b = loop_edges(loop)
+    d = b - a
+    perp = np.stack((-d[:, 1], d[:, 0]), axis=1)
+    if signed_area(loop) < 0:
+        perp = -perp
+    return perp + np.roll(perp, 1, axis=0)
+
+
+def turning_angles(loop):
+    a, b = loop_edges(loop)
+    d = b - a
+    prev = np.roll(d, 1, axis=0)
+    cross = prev[:, 0] * d[:, 1] - prev[:, 1] * d[:, 0]
+    return np.abs(np.arctan2(cross, (prev * d).sum(axis=1)))
+
+
+def resample_loop(loop, n, adaptive=0):
+    # places n samples evenly along the cumulative arc length, optionally mixing
+    # in the turning angle so that curved parts of the loop get more samples
+    a, b = loop_edges(loop)
+    weights = np.sqrt(((b - a) ** 2).sum(axis=1))
+    weights /= max(weights.sum(), 1e-12)
+    if adaptive:
+        turn = turning_angles(loop)
+        turn = (turn + np.roll(turn, -1)) / 2
+        if turn.sum() > 0:
+            weights = weights * (1 - adaptive) + turn / turn.sum() * adaptive
+
+    cumulative = np.concatenate(((0,), np.cumsum(weights)))
+    targets = np.arange(n) * cumulative[-1] / n
+    seg = np.clip(np.searchsorted(cumulative, targets, side='right') - 1, 0, len(weights) - 1)
+    t = (targets - cumulative[seg]) / np.where(weights[seg] > 0, weights[seg], 1)
+    return a[seg] + (b[seg] - a[seg]) * t[:, None]
+
+
+def expand_ranges(starts, counts):
+    # flattens the CSR ranges [start, start + count) into (owner, index) pairs
+    counts = np.asarray(counts, dtype=np.int64)
+    owner = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owner, np.repeat(starts, counts) + offsets
+
+
+def csr_from_keys(keys, n_keys):
+    order = np.argsort(keys, kind='stable')
+    counts = np.bincount(keys, minlength=n_keys)
+    starts = np.cumsum(counts) - counts
+    return order, starts, counts
+
+
+def loose_parts(n, edges):
+    # array union find: every edge hooks the larger root under the smaller one,
+    # then the parent links are jumped until each vertex points at its root
+    parent = np.arange(n)
+    while True:
+        a = parent[edges[:, 0]]
+        b = parent[edges[:, 1]]
+        join = a != b
+        if not join.any():
+            break
+        np.minimum.at(parent, np.maximum(a, b)[join], np.minimum(a, b)[join])
+        while True:
+            jumped = parent[parent]
+            if (jumped == parent).all():
+                break
+            parent = jumped
+    roots, labels = np.unique(parent, return_inverse=True)
+    return labels, len(roots)
+
+
+def orient(a, b, c):
+    return (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+
+
+def point_segment_distances(q, a, b):
+    # distance from every point to its own segment a -> b
+    ab = b - a
+    t = np.clip(((q - a) * ab).sum(axis=1) / np.maximum((ab * ab).sum(axis=1), 1e-24), 0, 1)
+    diff = q - a - ab * t[:, None]
+    return np.sqrt((diff * diff).sum(axis=1))
+
+
+class SegmentGrid:
+    def __init__(self, loop, max_cells=512):
+        self.a, self.b = loop_edges(loop)
+        lengths = np.sqrt(((self.b - self.a) ** 2).sum(axis=1))
+        self.origin = loop.min(axis=0)
+        extent = loop.max(axis=0) - self.origin
+        self.h = max(2 * lengths.mean(), extent.max() / max_cells, 1e-9)
+        self.nx, self.ny = (extent // self.h).astype(np.int64) + 1
+
+        # every segment goes into all the cells its bounding box touches
+        lo = self.cell_of(np.minimum(self.a, self.b))
+        hi = self.cell_of(np.maximum(self.a, self.b))
+        span = hi - lo + 1
+        seg, k = expand_ranges(np.zeros(len(span), dtype=np.int64), span[:, 0] * span[:, 1])
+        cx = lo[seg, 0] + k % span[seg, 0]
+        cy = lo[seg, 1] + k // span[seg, 0]
+        order, self.cell_start, self.cell_count = csr_from_keys(cy * self.nx + cx, self.nx * self.ny)
+        self.cell_segs = seg[order]
+        self.center_inside = self.cell_centers_inside()
+
+        # runs of consecutive segments merged pairwise up to a single root, for nearest
+        # segment queries. a run is bounded by the chord from its first to its last point
+        # and how far it strays from it, which on a smooth outline is the sagitta, so even
+        # points near the medial axis, about as close to every segment, open few runs;
+        # distance to a segment is convex, so a child's chord ends bound its offset
+        self.levels = [(self.a, self.b, np.zeros(len(self.a)))]
+        while len(self.levels[-1][0]) > 1:
+            a, b, spread = self.levels[-1]
+            left = np.arange(0, len(a), 2)
+            right = np.minimum(left + 1, len(a) - 1)
+            ca, cb = a[left], b[right]
+            offset = [np.maximum(point_segment_distances(a[child], ca, cb), point_segment_distances(b[child], ca, cb)) + spread[child]
+                      for child in (left, right)]
+            self.levels.append((ca, cb, np.maximum(*offset)))
+
+    def cell_of(self, pts):
+        return ((pts - self.origin) // self.h).astype(np.int64)
+
+    def cell_centers_inside(self):
+        # crossing parity of a +x ray from every cell center, one sorted pass per grid
+        a, b = self.a, self.b
+        y0 = (np.minimum(a[:, 1], b[:, 1]) - self.origin[1]) / self.h - 0.5
+        y1 = (np.maximum(a[:, 1], b[:, 1]) - self.origin[1]) / self.h - 0.5
+        r0 = np.ceil(y0).astype(np.int64)
+        seg, row = expand_ranges(r0, np.maximum(np.ceil(y1).astype(np.int64) - r0, 0))
+        row = np.clip(row, 0, self.ny - 1)
+        a, b = a[seg], b[seg]
+        yc = self.origin[1] + (row + 0.5) * self.h
+        x = a[:, 0] + (yc - a[:, 1]) * (b[:, 0] - a[:, 0]) / (b[:, 1] - a[:, 1])
+        keys = np.sort(row + np.clip((x - self.origin[0]) / (self.nx * self.h), 0, 1 - 1e-12))
+
+        cy, cx = np.divmod(np.arange(self.nx * self.ny), self.nx)
+        right = np.searchsorted(keys, cy + 1, side='left') - np.searchsorted(keys, cy + (cx + 0.5) / self.nx, side='right')
+        return right % 2 == 1
+
+    def inside(self, pts):
+        # a cell center's side is known, so only the segments of the point's own
+        # cell can be crossed on the way from that center to the point
+        cell = self.cell_of(pts)
+        in_grid = (cell >= 0).all(axis=1) & (cell[:, 0] < self.nx) & (cell[:, 1] < self.ny)
+        cell = np.clip(cell, 0, (self.nx - 1, self.ny - 1))
+        key = cell[:, 1] * self.nx + cell[:, 0]
+
+        owner, idx = expand_ranges(self.cell_start[key], self.cell_count[key])
+        seg = self.cell_segs[idx]
+        a, b = self.a[seg], self.b[seg]
+        c = self.origin + (cell[owner] + 0.5) * self.h
+        q = pts[owner]
+        crosses = ((orient(c, q, a) > 0) != (orient(c, q, b) > 0)) & ((orient(a, b, c) > 0) != (orient(a, b, q) > 0))
+        parity = np.bincount(owner, weights=crosses, minlength=len(pts)).astype(np.int64) % 2 == 1
+        return in_grid & (self.center_inside[key] != parity)
+
+    def distance(self, pts):
+        # walks the runs top down for every point at once, keeping those whose chord
+        # less its offset is nearer than the best so far; the ends of every kept run
+        # lie on the outline, so they tighten the best before the next level
+        best = np.full(len(pts), np.inf)
+        query = np.arange(len(pts))
+        node = np.zeros(len(pts), dtype=np.int64)
+        for depth in range(len(self.levels) - 2, -1, -1):
+            a, b, spread = self.levels[depth]
+            query = np.repeat(query, 2)
+            node = (node[:, None] * 2 + (0, 1)).ravel()
+            valid = node < len(a)
+            query, node = query[valid], node[valid]
+
+            q = pts[query]
+            near = point_segment_distances(q, a[node], b[node])
+            if not depth:
+                np.minimum.at(best, query, near)
+                break
+            keep = near - spread[node] < best[query]
+            query, node, q = query[keep], node[keep], q[keep]
+            ends = np.minimum(((q - a[node]) ** 2).sum(axis=1), ((q - b[node]) ** 2).sum(axis=1))
+            np.minimum.at(best, query, np.sqrt(ends))
+        return best
+
+    def radius(self, pts):
+        out = np.zeros(len(pts))
+        inside = self.inside(pts)
+        if inside.any():
+            out[inside] = self.distance(pts[inside])
+        return out
+
+
+class ChainIndex:
+    # segment index of a polyline that only grows at its end, closed by the chord from
+    # its last point back to the first. it keeps the same box levels as SegmentGrid,
+    # appended segments only patch the last box of every level, and the inside test
+    # walks the levels along a +x ray instead of relying on precomputed cell centers
+    def __init__(self, capacity=64):
+        self.n = 0
+        self.first = self.last = None
+        self.a = np.zeros((capacity, 2))
+        self.b = np.zeros((capacity, 2))
+        self.levels = []
+
+    def count(self, depth):
+        return (self.n + (1 << depth) - 1) >> depth
+
+    def reserve(self, n):
+        if n <= len(self.a):
+            return
+        capacity = max(n, 2 * len(self.a))
+        self.a = np.concatenate((self.a, np.zeros((capacity - len(self.a), 2))))
+        self.b = np.concatenate((self.b, np.zeros((capacity - len(self.b), 2))))
+        for depth, (lo, hi) in enumerate(self.levels):
+            size = (capacity >> depth) + 1
+            self.levels[depth] = (np.concatenate((lo, np.zeros((size - len(lo), 2)))),
+                                  np.concatenate((hi, np.zeros((size - len(hi), 2)))))
+
+    def extend(self, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if self.last is None and len(points):
+            self.first = self.last = points[0]
+            points = points[1:]
+        if not len(points):
+            return
+
+        chain = np.concatenate((self.last[None], points))
+        start, end = self.n, self.n + len(points)
+        self.reserve(end)
+        self.a[start:end] = chain[:-1]
+        self.b[start:end] = chain[1:]
+        self.last = points[-1]
+        self.n = end
+
+        if not self.levels:
+            self.levels.append((np.zeros((len(self.a) + 1, 2)), np.zeros((len(self.a) + 1, 2))))
+        lo, hi = self.levels[0]
+        lo[start:end] = np.minimum(chain[:-1], chain[1:])
+        hi[start:end] = np.maximum(chain[:-1], chain[1:])
+
+        depth = 1
+        while self.count(depth - 1) > 1:
+            if depth == len(self.levels):
+                size = (len(self.a) >> depth) + 1
+                self.levels.append((np.zeros((size, 2)), np.zeros((size, 2))))
+            child_lo, child_hi = self.levels[depth - 1]
+            lo, hi = self.levels[depth]
+            node = np.arange(start >> depth, self.count(depth))
+            right = np.minimum(2 * node + 1, self.count(depth - 1) - 1)
+            lo[node] = np.minimum(child_lo[2 * node], child_lo[right])
+            hi[node] = np.maximum(child_hi[2 * node], child_hi[right])
+            depth += 1
+
+    def walk(self, pts, keep):
+        # (query, segment) pairs left after dropping every box `keep` rejects, level by level
+        query = np.arange(len(pts))
+        node = np.zeros(len(pts), dtype=np.int64)
+        top = next(depth for depth in range(len(self.levels)) if self.count(depth) == 1)
+        for depth in range(top, -1, -1):
+            if depth < top:
+                query = np.repeat(query, 2)
+                node = (node[:, None] * 2 + (0, 1)).ravel()
+                valid = node < self.count(depth)
+                query, node = query[valid], node[valid]
+            lo, hi = self.levels[depth]
+            mask = keep(pts[query], lo[node], hi[node], query, node, depth)
+            query, node = query[mask], node[mask]
+        return query, node
+
+    def chord(self):
+        return self.last[None], self.first[None]
+
+    def inside(self, pts):
+        # crossing parity of a +x ray, over the segments whose boxes the ray passes
+        def crossed_by_ray(q, lo, hi, *_):
+            return (lo[:, 1] <= q[:, 1]) & (q[:, 1] <= hi[:, 1]) & (q[:, 0] <= hi[:, 0])
+
+        def crosses(q, a, b):
+            above = (a[:, 1] > q[:, 1]) != (b[:, 1] > q[:, 1])
+            dy = np.where(above, b[:, 1] - a[:, 1], 1)
+            return above & (q[:, 0] < a[:, 0] + (q[:, 1] - a[:, 1]) * (b[:, 0] - a[:, 0]) / dy)
+
+        parity = crosses(pts, *self.chord()).astype(np.int64)
+        if self.n:
+            query, seg = self.walk(pts, crossed_by_ray)
+            parity += np.bincount(query, weights=crosses(pts[query], self.a[seg], self.b[seg]),
+                                  minlength=len(pts)).astype(np.int64)
+        return parity % 2 == 1
+
+    def distance(self, pts):
+        # like SegmentGrid.distance, the chord is measured on its own
+        a, b = self.chord()
+        best = segment_distances(pts, a, b)
+        if not self.n:
+            return best
+        bound = best * best
+
+        def near(q, lo, hi, query, node, depth):
+            gap = np.maximum(np.maximum(lo - q, q - hi), 0)
+            diff = q - self.a[node << depth]
+            reach = bound.copy()
+            np.minimum.at(reach, query, (diff * diff).sum(axis=1))
+            return (gap * gap).sum(axis=1) <= reach[query]
+
+        query, seg = self.walk(pts, near)
+        a, ab = self.a[seg], self.b[seg] - self.a[seg]
+        q = pts[query]
+        t = np.clip(((q - a) * ab).sum(axis=1) / np.maximum((ab * ab).sum(axis=1), 1e-24), 0, 1)
+        diff = q - a - ab * t[:, None]
+        d2 = bound.copy()
+        np.minimum.at(d2, query, (diff * diff).sum(axis=1))
+        return np.sqrt(d2)
+
+    def radius(self, pts):
+        out = np.zeros(len(pts))
+        inside = self.inside(pts)
+        if inside.any():
+            out[inside] = self.distance(pts[inside])
+        return out
+
+
+class MedialSearch:
+    # multiplicative step search along each boundary vertex's inward normal, all at once;
+    # kept as state so the live preview can spread one search over several updates
+    def __init__(self, loop, precision=0.001, index=None, vertices=None):
+        if index is None:
+            index = SegmentGrid(loop)
+
+        evec = inward_vectors(loop)
+        if vertices is not None:
+            loop, evec = loop[vertices], evec[vertices]
+        n = len(loop)
+        self.index = index
+        self.loop = loop
+        self.evec = evec
+        self.size = np.full(n, precision)
+        self.last_size = self.size.copy()
+        self.incr = np.full(n, 2.0)
+        self.scr = index.radius(loop + evec * self.size[:, None])
+        self.last_scr = self.scr.copy()
+        self.cap = 1 + precision
+        self.active = np.flatnonzero(self.incr > self.cap)
+
+    def step(self):
+        # one probe for every vertex still searching, false once all have settled
+        active, size, scr = self.active, self.size, self.scr
+        if not active.size:
+            return False
+        probe = size[active] * self.incr[active]
+        scr1 = self.index.radius(self.loop[active] + self.evec[active] * probe[:, None])
+        grow = scr1 > scr[active]
+
+        up = active[grow]
+        self.last_size[up] = size[up]
+        self.last_scr[up] = scr[up]
+        size[up] = probe[grow]
+        scr[up] = scr1[grow]
+
+        down = active[~grow]
+        self.incr[down] = (self.incr[down] + 1) / 2
+        size[down] = self.last_size[down]
+        scr[down] = self.last_scr[down]
+
+        self.active = active[self.incr[active] > self.cap]
+        return bool(self.active.size)
+
+    def result(self):
+        return self.loop + self.evec * self.size[:, None], self.scr
+
+
+def medial_search(loop, precision=0.001, index=None, vertices=None):
+    search = MedialSearch(loop, precision, index, vertices)
+    while search.step():
+        pass
+    return search.result()
+
+
+def loop_triangles(loop):
+    from mathutils.geometry import delaunay_2d_cdt
+
+    # output type 1 keeps only the constrained delaunay triangles inside the loop
+    verts, _, faces, _, _, _ = delaunay_2d_cdt([tuple(p) for p in loop], [], [list(range(len(loop)))], 1, 1e-6)
+    tris = np.array([f for f in faces if len(f) == 3], dtype=np.int64).reshape(-1, 3)
+    return np.array([tuple(v) for v in verts], dtype=np.float64).reshape(-1, 2), tris
+
+
+def circumcenters(a, b, c):
+    sa = (a * a).sum(axis=1)
+    sb = (b * b).sum(axis=1)
+    sc = (c * c).sum(axis=1)
+    d = 2 * (a[:, 0] * (b[:, 1] - c[:, 1]) + b[:, 0] * (c[:, 1] - a[:, 1]) + c[:, 0] * (a[:, 1] - b[:, 1]))
+    valid = np.abs(d) > 1e-12
+    d = np.where(valid, d, 1)
+    x = (sa * (b[:, 1] - c[:, 1]) + sb * (c[:, 1] - a[:, 1]) + sc * (a[:, 1] - b[:, 1])) / d
+    y = (sa * (c[:, 0] - b[:, 0]) + sb * (a[:, 0] - c[:, 0]) + sc * (b[:, 0] - a[:, 0])) / d
+    return np.stack((x, y), axis=1), valid
+
+
+def delaunay_medial(loop, index=None):
+    # the circumcenters of the delaunay triangles are the voronoi vertices of the
+    # boundary samples, which converge to the medial axis as sampling gets denser
+    if index is None:
+        index = SegmentGrid(loop)
+
+    verts, tris = loop_triangles(loop)
+    centers, valid = circumcenters(verts[tris[:, 0]], verts[tris[:, 1]], verts[tris[:, 2]])
+    centers = centers[valid]
+
+    # constrained triangles are not always delaunay, so the inscribed radius is
+    # taken from the boundary itself, dropping centers that land outside the loop
+    radii = index.radius(centers)
+    inside = radii > 0
+    return centers[inside], radii[inside]
+
+
+def segment_distances(pts, a, b):
+    # distance from every point to the nearest of the segments a -> b
+    ab = b - a
+    ap = pts[:, None] - a[None]
+    t = np.clip((ap * ab[None]).sum(axis=2) / np.maximum((ab * ab).sum(axis=1), 1e-24), 0, 1)
+    diff = ap - ab[None] * t[..., None]
+    return np.sqrt((diff * diff).sum(axis=2).min(axis=1))
+
+
+class MedialPreview:
+    # medial circles of a stroke that is still being drawn, closed by the chord
+    # from its last to its first sample. only circles that the newly drawn
+    # segments or the moving chord can reach are recomputed, newest first.
+    # a batched search has a mostly fixed cost, so updates spend time credited
+    # at `budget` per call. a search that runs out of credit resumes on the next
+    # update, and stale circles left over carry to later ones. the samples' segment
+    # index and winding grow with them, so no update pays for the whole stroke
+    def __init__(self, spacing=6.0, precision=0.01, budget=0.004, chunk=64):
+        self.spacing = spacing
+        self.precision = precision
+        self.budget = budget
+        self.chunk = chunk
+        self.count = 0
+        self.last = None
+        self.carry = 0.0
+        self.samples = np.zeros((0, 2))
+        self.centers = np.zeros((0, 2))
+        self.radii = np.zeros(0)
+        self.stale = np.zeros(0, dtype=bool)
+        self.updated = np.zeros(0, dtype=np.int64)
+        self.search = None
+        self.searching = None
+        self.index = ChainIndex()
+        self.chain_area = 0.0
+        self.orientation = 0
+        self.credit = 0.0
+
+    def add_point(self, point):
+        point = np.array(point[:2], dtype=np.float64)
+        self.count += 1
+        if self.last is None:
+            self.last = point
+            self.append_samples(point[None])
+            return
+
+        d = point - self.last
+        length = np.sqrt((d * d).sum())
+        t = np.arange(self.spacing - self.carry, length, self.spacing)
+        self.carry = length - t[-1] if len(t) else self.carry + length
+        if len(t):
+            self.append_samples(self.last + d * (t / length)[:, None])
+        self.last = point
+
+    def append_samples(self, new):
+        old = self.samples
+        self.samples = np.concatenate((old, new))
+        self.centers = np.concatenate((self.centers, new))
+        self.radii = np.concatenate((self.radii, np.zeros(len(new))))
+        self.stale = np.concatenate((self.stale, np.ones(len(new), dtype=bool)))
+        self.index.extend(new)
+        chain = np.concatenate((old[-1:], new))
+        self.chain_area += (chain[:-1, 0] * chain[1:, 1] - chain[1:, 0] * chain[:-1, 1]).sum()
+        if len(old) < 2:
+            return
+
+        a = np.concatenate((chain[:-1], old[-1:], new[-1:]))
+        b = np.concatenate((chain[1:], old[:1], old[:1]))
+        # the step search probes up to about twice the way from the sample to its center,
+        # and each probe sees the boundary as far as its own radius; circles whose search
+        # is still running are judged by how far it has got
+        if self.search is not None:
+            self.centers[self.searching], self.radii[self.searching] = self.search.result()
+        n = len(old)
+        probe_reach = self.radii[:n] + 2 * np.sqrt(((self.centers[:n] - old) ** 2).sum(axis=1)) + self.spacing
+        reach = segment_distances(self.centers[:n], a, b) <= probe_reach
+        self.stale[:n] |= reach
+        self.stale[[0, n - 1]] = True
+
+        # inward directions all flip when the stroke changes winding
+        last, first = self.samples[-1], self.samples[0]
+        orientation = np.sign(self.chain_area + last[0] * first[1] - first[0] * last[1])
+        if orientation != self.orientation:
+            self.stale[:] = True
+            self.search = None
+        self.orientation = orientation
+
+    @property
+    def busy(self):
+        return self.search is not None or (len(self.samples) >= 3 and self.stale.any())
+
+    def update(self):
+        # true when circles changed, their indices are in `updated`
+        self.credit = min(self.credit + self.budget, 2 * self.budget)
+        if not self.busy or self.credit <= 0:
+            return False
+
+        start = perf_counter()
+        if self.search is None:
+            # circles made stale again while their search runs stay stale
+            self.searching = np.flatnonzero(self.stale)[::-1][:self.chunk]
+            self.stale[self.searching] = False
+            self.search = MedialSearch(self.samples, self.precision, self.index, self.searching)
+        while self.search.step() and perf_counter() - start < self.credit:
+            pass
+        self.credit -= perf_counter() - start
+        if self.search.active.size:
+            return False
+
+        centers, radii = self.search.result()
+        self.centers[self.searching] = centers
+        self.radii[self.searching] = radii
+        self.updated = self.searching
+        self.search = None
+        return True
+
+
+def wrap_angle(a):
+    return (a + pi) % (2 * pi) - pi
+
+
+class StrokeFilter:
+    # streaming input stage, O(1) per input point: one pole smoothing, a minimum
+    # spacing between points, and cone intersection simplification. every point
+    # since the last committed one must stay within `tolerance` of the line from
+    # it, so the directions that still satisfy all of them form a shrinking cone;
+    # a point outside the cone commits the previous point and starts a new one
+    def __init__(self, smoothing=0.5, spacing=2.0, tolerance=1.0):
+        self.smoothing = smoothing
+        self.spacing = spacing
+        self.tolerance = tolerance
+        self.points = []
+        self.smoothed = None
+        self.tail = None
+        self.cone = None
+
+    @property
+    def polyline(self):
+        return self.points + [self.tail] if self.tail else self.points[:]
+
+    def add(self, point):
+        x, y = point[0], point[1]
+        if self.smoothed is None:
+            self.smoothed = (x, y)
+            self.points.append(self.smoothed)
+            return
+
+        sx, sy = self.smoothed
+        k = 1 - self.smoothing
+        self.smoothed = sx + (x - sx) * k, sy + (y - sy) * k
+        last = self.tail or self.points[-1]
+        if hypot(self.smoothed[0] - last[0], self.smoothed[1] - last[1]) >= self.spacing:
+            self.push(self.smoothed)
+
+    def push(self, point):
+        angle, half = self.direction(point)
+        if self.cone is not None:
+            center, width = self.cone
+            delta = wrap_angle(angle - center)
+            if abs(delta) > width:
+                self.points.append(self.tail)
+                self.cone = None
+                angle, half = self.direction(point)
+            else:
+                lo = max(-width, delta - half)
+                hi = min(width, delta + half)
+                self.cone = center + (lo + hi) / 2, (hi - lo) / 2
+
+        if self.cone is None:
+            self.cone = angle, half
+        self.tail = point
+
+    def direction(self, point):
+        ax, ay = self.points[-1]
+        dx, dy = point[0] - ax, point[1] - ay
+        return atan2(dy, dx), asin(min(self.tolerance / max(hypot(dx, dy), 1e-12), 1))
@@ -0,0 +1,21 @@
+# loads the add-on's modules for the scripts and tests that run them outside of it;
+# the add-on's __init__ needs bpy, so outside blender the modules go into a bare package
+import importlib
+import os
+import sys
+import types
+
+
+def load_package():
+    if __package__:
+        return __package__
+    name = 'base_tools_headless'
+    if name not in sys.modules:
+        package = types.ModuleType(name)
+        package.__path__ = [os.path.dirname(os.path.abspath(__file__))]
+        sys.modules[name] = package
+    return name
+
+
+def load(module):
+    return importlib.import_module(load_package() + '.' + module)
@@ -1,6 +1,10 @@
 import bpy
+import numpy as np
+from time import perf_counter
 from . draw2d import Draw2D, lerp
+from . import timing
 from mathutils import Vector
+from mathutils.bvhtree import BVHTree
 from bpy_extras.view3d_utils import (location_3d_to_region_2d,
                                      region_2d_to_location_3d,
                                      region_2d_to_origin_3d,
@@ -37,11 +41,142 @@ def from_2d_to_3d(world_vector, context, depth_location=None):
 
 def scene_raycast(mouse_co, context):
     origin = from_2d_to_3d_origin(mouse_co, context)
-    normal = from_2d_to_3d_origin(mouse_co, context)
+    normal = from_2d_to_3d_normal(mouse_co, context)
     view_layer = context.view_layer
     return context.scene.ray_cast(view_layer, origin, normal)
 
 
+class SceneBVH:
+    # bvh trees of the visible evaluated meshes, each in its object's space, keyed by
+    # object name; a tree is built on first use and dropped when the depsgraph reports
+    # a geometry or transform change on its object
+    def __init__(self):
+        self.trees = {}
+        bpy.app.handlers.depsgraph_update_post.append(self.on_update)
+
+    def on_update(self, scene, depsgraph=None):
+        if depsgraph is None:
+            self.trees.clear()
+            return
+        for update in depsgraph.updates:
+            if isinstance(update.id, bpy.types.Object) and (update.is_updated_geometry or update.is_updated_transform):
+                self.trees.pop(update.id.name, None)
+
+    def free(self):
+        if self.on_update in bpy.app.handlers.depsgraph_update_post:
+            bpy.app.handlers.depsgraph_update_post.remove(self.on_update)
+        self.trees.clear()
+
+    def get(self, context):
+        # objects hidden, deleted or renamed since the last call are pruned, new ones built
+        visible = [ob for ob in context.visible_objects if ob.type == 'MESH']
+        names = {ob.name for ob in visible}
+        for name in [name for name in self.trees if name not in names]:
+            del self.trees[name]
+
+        depsgraph = None
+        for ob in visible:
+            if ob.name in self.trees:
+                continue
+            depsgraph = depsgraph or context.evaluated_depsgraph_get()
+            corners = np.array(ob.evaluated_get(depsgraph).bound_box)
+            matrix = np.array(ob.matrix_world)
+            self.trees[ob.name] = (BVHTree.FromObject(ob, depsgraph), matrix, np.linalg.inv(matrix),
+                                   corners.min(axis=0), corners.max(axis=0))
+        return list(self.trees.values())
+
+
+def rays_cross_box(origins, directions, lo, hi):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inv = 1 / directions
+        t1 = (lo - origins) * inv
+        t2 = (hi - origins) * inv
+    near = np.nanmax(np.minimum(t1, t2), axis=1)
+    far = np.nanmin(np.maximum(t1, t2), axis=1)
+    return far >= np.maximum(near, 0)
+
+
+def raycast_trees(trees, origins, directions):
+    # nearest hit of every ray over all trees, nan where nothing is hit; the rays go into
+    # each object's space in one product and only those crossing its bounds are cast
+    hits = np.full(origins.shape, np.nan)
+    best = np.full(len(origins), np.inf)
+    for tree, matrix, inverse, lo, hi in trees:
+        local_origins = origins @ inverse[:3, :3].T + inverse[:3, 3]
+        local_directions = directions @ inverse[:3, :3].T
+        for i in np.flatnonzero(rays_cross_box(local_origins, local_directions, lo, hi)):
+            location = tree.ray_cast(Vector(local_origins[i]), Vector(local_directions[i]))[0]
+            if location is None:
+                continue
+            world = matrix[:3, :3] @ np.array(location) + matrix[:3, 3]
+            distance = np.sqrt(((world - origins[i]) ** 2).sum())
+            if distance < best[i]:
+                best[i] = distance
+                hits[i] = world
+    return hits
+
+
+def surface_points(trees, projection, screen):
+    origins, directions = projection.rays(screen)
+    return raycast_trees(trees, origins, directions)
+
+
+class ViewProjection:
+    # region size and view matrices captured once, mapping whole arrays of points
+    # between region pixels and world space with a single matrix product each
+    def __init__(self, context):
+        region = context.region
+        rv3d = context.space_data.region_3d
+        self.size = np.array((region.width, region.height), dtype=np.float64)
+        self.perspective = np.array(rv3d.perspective_matrix, dtype=np.float64)
+        self.inverse = np.linalg.inv(self.perspective)
+        self.view_rotation = rv3d.view_rotation.copy()
+        self.view_normal = np.array(self.view_rotation @ Vector((0, 0, 1)), dtype=np.float64)
+
+    def is_current(self, context):
+        region = context.region
+        return (self.size[0] == region.width and self.size[1] == region.height and
+                np.array_equal(self.perspective, np.array(context.space_data.region_3d.perspective_matrix)))
+
+    def to_2d(self, world):
+        # like location_3d_to_region_2d, points behind the view come out as nan
+        world = np.asarray(world, dtype=np.float64).reshape(-1, 3)
+        clip = np.column_stack((world, np.ones(len(world)))) @ self.perspective.T
+        w = clip[:, 3:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            screen = (clip[:, :2] / w + 1) * self.size / 2
+        screen[w[:, 0] <= 0] = np.nan
+        return screen
+
+    def rays(self, screen):
+        # a point on the near clip plane and the unit direction through every pixel
+        screen = np.asarray(screen, dtype=np.float64).reshape(-1, 2)
+        ndc = screen / (self.size / 2) - 1
+        ones = np.ones(len(ndc))
+        near = np.column_stack((ndc, -ones, ones)) @ self.inverse.T
+        far = np.column_stack((ndc, ones, ones)) @ self.inverse.T
+        near = near[:, :3] / near[:, 3:]
+        direction = far[:, :3] / far[:, 3:] - near
+        return near, direction / np.sqrt((direction * direction).sum(axis=1))[:, None]
+
+    def to_3d(self, screen, depth_location):
+        # like region_2d_to_location_3d, on the view aligned plane through depth_location
+        origin, direction = self.rays(screen)
+        t = (np.asarray(depth_location, dtype=np.float64) - origin) @ self.view_normal / (direction @ self.view_normal)
+        return origin + direction * t[:, None]
+
+
+class CoalescedMove:
+    # stands in for the MOUSEMOVE events held back while coalescing, blender's
+    # own event objects are not safe to keep past the modal call
+    type = 'MOUSEMOVE'
+    value = 'NOTHING'
+
+    def __init__(self, x, y):
+        self.mouse_region_x = x
+        self.mouse_region_y = y
+
+
 class InteractiveOperator(bpy.types.Operator):
     bl_idname = "view3d.modal"
     bl_label = "Modal"
@@ -53,8 +188,31 @@ class InteractiveOperator(bpy.types.Operator):
     press = False
     release = False
     loop_generator = None
-    mouse_co = Vector((0, 0, 0))
-    last_mouse = Vector((0, 0, 0))
+    mouse_xy = (0, 0)
+    last_xy = (0, 0)
+
+    # with coalesce_events, mouse moves reach the loop at most frame_rate times a
+    # second, and every position since the last one is kept in self.coalesced
+    coalesce_events = False
+    frame_rate = 60
+    frame_timer = None
+    move_pending = False
+    last_delivery = 0
+    last_ret = {'RUNNING_MODAL'}
+    projection = None
+
+    def view_projection(self, context):
+        if self.projection is None or not self.projection.is_current(context):
+            self.projection = ViewProjection(context)
+        return self.projection
+
+    @property
+    def mouse_co(self):
+        return Vector((self.mouse_xy[0], self.mouse_xy[1], 0))
+
+    @property
+    def last_mouse(self):
+        return Vector((self.last_xy[0], self.last_xy[1], 0))
 
     def press_release_check(self, event, compare, property):
         if event.type == compare:
@@ -79,12 +237,18 @@ class InteractiveOperator(bpy.types.Operator):
         self.press_release_check(event, 'RIGHTMOUSE', 'r_mouse')
         self.press_release_check(event, 'MIDDLEMOUSE', 'middle')
 
-        self.last_mouse = self.mouse_co
-        self.mouse_co = Vector((event.mouse_region_x, event.mouse_region_y, 0))
+        self.last_xy = self.mouse_xy
+        self.mouse_xy = (event.mouse_region_x, event.mouse_region_y)
 
     def finish(self, context, type):
         pass
 
+    def cleanup(self, context):
+        self.draw.remove_handler()
+        if self.frame_timer:
+            context.window_manager.event_timer_remove(self.frame_timer)
+            self.frame_timer = None
+
     def loop(self, context):
         while True:
             event = yield {'RUNNING_MODAL'}
@@ -94,8 +258,10 @@ class InteractiveOperator(bpy.types.Operator):
 
             raise NotImplemented('insert code here')
 
-    def modal(self, context, event):
+    def deliver(self, context, event):
         self.handle_mouse(event)
+        self.move_pending = False
+        self.last_delivery = perf_counter()
         try:
             ret = self.loop_generator.send(event)
 
@@ -103,21 +269,52 @@ class InteractiveOperator(bpy.types.Operator):
             ret = e.value
 
         except:
-            self.draw.remove_handler()
+            self.cleanup(context)
             raise
 
+        finally:
+            self.coalesced.clear()
+
+        if timing.profiler and event.type != 'TIMER':
+            timing.profiler.record('modal event', perf_counter() - self.last_delivery)
+            self.draw.overlay = timing.profiler.summary()
+            context.area.tag_redraw()
+        elif not timing.profiler and self.draw.overlay:
+            # profiling was switched off while the operator runs
+            self.draw.overlay = []
+            context.area.tag_redraw()
+
         if 'FINISHED' in ret or 'CANCELLED' in ret:
-            self.draw.remove_handler()
+            self.cleanup(context)
             self.finish(context, type)
+        self.last_ret = ret
         return ret
 
+    def modal(self, context, event):
+        if event.type == 'MOUSEMOVE':
+            self.coalesced.append((event.mouse_region_x, event.mouse_region_y))
+            if self.coalesce_events and perf_counter() - self.last_delivery < 1 / self.frame_rate:
+                self.move_pending = True
+                return self.last_ret
+
+        elif self.move_pending:
+            # held back moves go first, so the loop sees events in order
+            ret = self.deliver(context, CoalescedMove(*self.coalesced[-1]))
+            if 'FINISHED' in ret or 'CANCELLED' in ret:
+                return ret
+
+        return self.deliver(context, event)
+
     def invoke(self, context, event):
+        self.coalesced = []
         self.draw = Draw2D()
         self.draw.setup_handler()
         self.loop_generator = self.loop(context)
         next(self.loop_generator)
 
         if context.area.type == 'VIEW_3D':
+            if self.coalesce_events:
+                self.frame_timer = context.window_manager.event_timer_add(1 / self.frame_rate, window=context.window)
             context.window_manager.modal_handler_add(self)
             return {'RUNNING_MODAL'}
         else:
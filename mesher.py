@@ -0,0 +1,231 @@
+import numpy as np
+
+from .geometry import expand_ranges
+
+
+def ball_field(d2, r2, stiffness=2.0):
+    # same falloff as blender's metaball balls
+    f = np.maximum(1 - d2 / r2, 0)
+    return stiffness * f * f * f
+
+
+def pack_keys(coords, dims):
+    return (coords[..., 0] * dims[..., 1] + coords[..., 1]) * dims[..., 2] + coords[..., 2]
+
+
+def grid_coords(index, dims):
+    yz = dims[..., 1] * dims[..., 2]
+    return np.stack((index // yz, index // dims[..., 2] % dims[..., 1], index % dims[..., 2]), axis=-1)
+
+
+def narrow_band(centers, radii, origin, span, threshold, stiffness):
+    # pairs every ball with the blocks its support touches, keeping only the blocks
+    # that can hold the surface: not fully solid under one ball, not below threshold
+    lo = ((centers - radii[:, None] - origin) // span).astype(np.int64)
+    hi = ((centers + radii[:, None] - origin) // span).astype(np.int64)
+    ext = hi - lo + 1
+    dims = hi.max(axis=0) + 1
+    ball, k = expand_ranges(np.zeros(len(ext), dtype=np.int64), ext.prod(axis=1))
+    block = lo[ball] + grid_coords(k, ext[ball])
+
+    box_lo = origin + block * span
+    c = centers[ball]
+    r2 = radii[ball] ** 2
+    gap = np.maximum(np.maximum(box_lo - c, c - box_lo - span), 0)
+    near = (gap * gap).sum(axis=1)
+    far = np.maximum(np.abs(c - box_lo), np.abs(c - box_lo - span))
+    far = (far * far).sum(axis=1)
+
+    touches = near < r2
+    ball, block, near, far, r2 = ball[touches], block[touches], near[touches], far[touches], r2[touches]
+
+    key = pack_keys(block, dims)
+    order = np.argsort(key, kind='stable')
+    ball, key, near, far, r2 = ball[order], key[order], near[order], far[order], r2[order]
+    blocks, starts = np.unique(key, return_index=True)
+
+    solid = np.maximum.reduceat(ball_field(far, r2, stiffness), starts) >= threshold
+    reach = np.add.reduceat(ball_field(near, r2, stiffness), starts) >= threshold
+    keep = reach & ~solid
+
+    counts = np.diff(np.append(starts, len(key)))
+    pair_keep = np.repeat(keep, counts)
+    return grid_coords(blocks[keep], dims), ball[pair_keep], np.repeat(np.arange(keep.sum()), counts[keep])
+
+
+def sample_blocks(blocks, ball_of_pair, block_of_pair, centers, radii, origin, voxel, block_size, stiffness, chunk=512):
+    n = block_size + 1
+    lattice = np.stack(np.meshgrid(np.arange(n), np.arange(n), np.arange(n), indexing='ij'), axis=-1).reshape(-1, 3)
+    field = np.zeros((len(blocks), len(lattice)))
+    for i in range(0, len(ball_of_pair), chunk):
+        ball = ball_of_pair[i:i + chunk]
+        owner = block_of_pair[i:i + chunk]
+        pts = origin + (blocks[owner] * block_size)[:, None] * voxel + lattice[None] * voxel
+        diff = pts - centers[ball][:, None]
+        contrib = ball_field((diff * diff).sum(axis=2), radii[ball][:, None] ** 2, stiffness)
+        # pairs come sorted by block, so each block's balls are summed in one run
+        owners, starts = np.unique(owner, return_index=True)
+        field[owners] += np.add.reduceat(contrib, starts, axis=0)
+    return field.reshape(len(blocks), n, n, n)
+
+
+CUBE_CORNERS = np.array([(x, y, z) for x in (0, 1) for y in (0, 1) for z in (0, 1)])
+CUBE_EDGES = np.array([(a, b) for a in range(8) for b in range(8) if np.abs(CUBE_CORNERS[b] - CUBE_CORNERS[a]).sum() == 1
+                       and (CUBE_CORNERS[b] >= CUBE_CORNERS[a]).all()])
+
+
+def cube_faces():
+    # corners of the six cube faces in order around them, with the face's outward normal
+    for axis in range(3):
+        u, v = (axis + 1) % 3, (axis + 2) % 3
+        for side in (0, 1):
+            ring = []
+            for du, dv in ((0, 0), (1, 0), (1, 1), (0, 1)):
+                c = np.zeros(3, dtype=np.int64)
+                c[axis], c[u], c[v] = side, du, dv
+                ring.append(int(np.flatnonzero((CUBE_CORNERS == c).all(axis=1))[0]))
+            normal = np.zeros(3)
+            normal[axis] = 1 if side else -1
+            yield ring, normal
+
+
+def cube_cycles(case):
+    # the surface in one cube as cycles of crossed edges; every face links its crossed
+    # edges the same way for both cubes sharing it, a face with two diagonal inside corners
+    # cuts each of them off, so the pieces always join up into a closed manifold
+    inside = [(case >> i) & 1 for i in range(8)]
+    edge_of = {(a, b): k for k, (a, b) in enumerate(CUBE_EDGES.tolist())}
+    mid = (CUBE_CORNERS[CUBE_EDGES[:, 0]] + CUBE_CORNERS[CUBE_EDGES[:, 1]]) / 2
+    nxt = {}
+    for ring, normal in cube_faces():
+        sides = [edge_of[tuple(sorted((ring[k], ring[(k + 1) % 4])))] for k in range(4)]
+        crossed = [k for k in range(4) if inside[ring[k]] != inside[ring[(k + 1) % 4]]]
+        if len(crossed) == 2:
+            pairs = [crossed]
+        else:
+            pairs = [((k - 1) % 4, k) for k in crossed if inside[ring[k]]]
+        for i, j in pairs:
+            a, b = sides[i], sides[j]
+            # walking a to b the cut off corner lies inside on the left of the outward normal
+            center = (mid[a] + mid[b]) / 2
+            corner = min(ring, key=lambda c: ((CUBE_CORNERS[c] - center) ** 2).sum())
+            left = np.cross(mid[b] - mid[a], normal) @ (CUBE_CORNERS[corner] - mid[a]) > 0
+            if left != bool(inside[corner]):
+                a, b = b, a
+            nxt[a] = b
+
+    cycles = []
+    while nxt:
+        cycle = [next(iter(nxt))]
+        while nxt[cycle[-1]] != cycle[0]:
+            cycle.append(nxt.pop(cycle[-1]))
+        nxt.pop(cycle[-1])
+        cycles.append(cycle)
+    return cycles
+
+
+def triangle_table():
+    tables = [[(c[0], c[i], c[i + 1]) for c in cube_cycles(case) for i in range(1, len(c) - 1)] for case in range(256)]
+    counts = np.array([len(t) for t in tables])
+    table = np.zeros((256, counts.max(), 3), dtype=np.int64)
+    for case, tris in enumerate(tables):
+        if tris:
+            table[case, :len(tris)] = tris
+    return table, counts
+
+
+TRIANGLES, TRIANGLE_COUNTS = triangle_table()
+
+
+def marching_cubes(blocks, field, origin, voxel, block_size, threshold):
+    # triangles on the crossed lattice edges of every block, each crossing is one vertex
+    b = block_size
+    inside = field >= threshold
+
+    def corner(f, off):
+        x, y, z = off
+        return f[:, x:x + b, y:y + b, z:z + b]
+
+    case = sum(corner(inside, c).astype(np.int64) << i for i, c in enumerate(CUBE_CORNERS))
+    block_idx, x, y, z = np.nonzero(TRIANGLE_COUNTS[case])
+    if not len(block_idx):
+        return np.zeros((0, 3)), np.zeros((0, 3), dtype=np.int64)
+    cells = blocks[block_idx] * b + np.stack((x, y, z), axis=1)
+    case = case[block_idx, x, y, z]
+    values = np.stack([corner(field, c)[block_idx, x, y, z] for c in CUBE_CORNERS], axis=1)
+
+    cell, k = expand_ranges(np.zeros(len(case), dtype=np.int64), TRIANGLE_COUNTS[case])
+    edges = TRIANGLES[case[cell], k].ravel()
+    cell = np.repeat(cell, 3)
+    lo, hi = CUBE_EDGES[edges, 0], CUBE_EDGES[edges, 1]
+    point = cells[cell] + CUBE_CORNERS[lo]
+    step = CUBE_CORNERS[hi] - CUBE_CORNERS[lo]
+
+    dims = point.max(axis=0) + 1
+    keys = pack_keys(point, dims) * 3 + step.argmax(axis=1)
+    _, first, index = np.unique(keys, return_index=True, return_inverse=True)
+    f0, f1 = values[cell[first], lo[first]], values[cell[first], hi[first]]
+    t = (threshold - f0) / (f1 - f0)
+    verts = origin + (point[first] + step[first] * t[:, None]) * voxel
+    return verts, index.reshape(-1, 3)
+
+
+def blob_voxel(centers, radii, resolution):
+    # voxel size giving `resolution` voxels across the narrower side of the blob's bounds
+    min_bound = (centers - radii[:, None]).min(axis=0)
+    max_bound = (centers + radii[:, None]).max(axis=0)
+    return min(max_bound[:2] - min_bound[:2]) / resolution
+
+
+def budget_voxel(centers, radii, budget, threshold=0.01, pilot=16):
+    # the face count goes with the inverse square of the voxel size, so a coarse pass
+    # over the same balls predicts the voxel that meets the budget; the pass is kept
+    # fine enough for the typical ball, thin strokes would slip through the grid otherwise;
+    # zero radii where a stroke crosses itself are left out, they would take the median to zero
+    radii = np.asarray(radii, dtype=np.float64)
+    coarse = blob_voxel(centers, radii, pilot)
+    positive = radii[radii > 0]
+    typical = np.median(positive) / 2 if len(positive) else 0
+    voxel = min(coarse, typical) if typical > 0 else coarse
+    if not voxel > 0:
+        return coarse
+    faces = len(polygonize_balls(centers, radii, voxel, threshold)[1])
+    if not faces:
+        return voxel
+    return voxel * np.sqrt(faces / budget)
+
+
+def polygonize_balls(centers, radii, voxel, threshold=0.01, stiffness=2.0, block_size=8):
+    keep = radii > 0
+    centers = np.asarray(centers, dtype=np.float64)[keep]
+    radii = np.asarray(radii, dtype=np.float64)[keep]
+    if not len(radii) or voxel <= 0:
+        return np.zeros((0, 3)), np.zeros((0, 3), dtype=np.int64)
+
+    origin = (centers - radii[:, None]).min(axis=0) - voxel
+    span = voxel * block_size
+    blocks, ball_of_pair, block_of_pair = narrow_band(centers, radii, origin, span, threshold, stiffness)
+    if not len(blocks):
+        return np.zeros((0, 3)), np.zeros((0, 3), dtype=np.int64)
+
+    field = sample_blocks(blocks, ball_of_pair, block_of_pair, centers, radii, origin, voxel, block_size, stiffness)
+    return marching_cubes(blocks, field, origin, voxel, block_size, threshold)
+
+
+def mesh_from_arrays(name, verts, faces):
+    # bpy is only imported here, so the mesher also runs outside blender
+    import bpy
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(len(verts))
+    mesh.vertices.foreach_set('co', np.ascontiguousarray(verts, dtype=np.float32).ravel())
+
+    sides = faces.shape[1]
+    mesh.loops.add(faces.size)
+    mesh.loops.foreach_set('vertex_index', np.ascontiguousarray(faces, dtype=np.int32).ravel())
+    mesh.polygons.add(len(faces))
+    mesh.polygons.foreach_set('loop_start', np.arange(0, faces.size, sides, dtype=np.int32))
+    mesh.polygons.foreach_set('loop_total', np.full(len(faces), sides, dtype=np.int32))
+
+    mesh.update(calc_edges=True)
+    mesh.validate()
+    return mesh
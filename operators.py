@@ -0,0 +1,63 @@
+import bpy
+from . register import lazy_operator
+
+# the registered operators only declare their interface here, their methods
+# are taken from the implementation modules the first time they are used
+
+
+@lazy_operator('blobsketch', 'BlobSketch', ('invoke', 'modal'))
+class BlobSketch(bpy.types.Operator):
+    bl_idname = 'base_tools.blobsketch'
+    bl_label = 'Blob Sketch'
+    bl_options = {'REGISTER', 'UNDO'}
+
+
+@lazy_operator('boolean', 'Boolean', ('execute',))
+class Boolean(bpy.types.Operator):
+    bl_idname = 'base_tools.boolean'
+    bl_label = 'Boolean'
+    bl_options = {'REGISTER', 'UNDO'}
+
+    operation: bpy.props.EnumProperty(
+        name='Operation',
+        items=[
+            ('UNION', 'union', 'union'),
+            ('DIFFERENCE', 'difference', 'difference'),
+            ('INTERSECT', 'intersect', 'intersect'),
+            ('SLICE', 'slice', 'cut objects using active as knife'),
+            ('MERGE', 'merge', 'union all selected meshes into the active one')
+        ]
+    )
+
+    remove: bpy.props.BoolProperty(
+        name='remove',
+        description='Remove active object after operation',
+        default=True
+    )
+
+    ngons: bpy.props.BoolProperty(
+        name='ngons',
+        description='allow ngons in mesh',
+        default=True
+    )
+
+    backend: bpy.props.EnumProperty(
+        name='Backend',
+        items=[
+            ('EXACT', 'exact', 'boolean modifier on the mesh surfaces'),
+            ('VOXEL', 'voxel', 'signed distance grids, cost follows the voxel count, slice stays exact')
+        ]
+    )
+
+    voxel_size: bpy.props.FloatProperty(
+        name='voxel size',
+        min=0.0001,
+        default=0.02
+    )
+
+    workers: bpy.props.IntProperty(
+        name='workers',
+        description='processes evaluating grid blocks',
+        min=1,
+        default=1
+    )
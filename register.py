@@ -1,5 +1,10 @@
 import bpy
+import ast
+import hashlib
 import importlib
+import os
+import sys
+from time import perf_counter
 
 
 class RegisterStuff:
@@ -9,6 +14,9 @@ class RegisterStuff:
     imported_modules = []
     registered_classes = []
     module_names = []
+    load_times = {}
+    lazy_classes = []
+    sources = {}
 
     def __init__(self):
         raise RuntimeError("cant instantiate")
@@ -34,21 +42,64 @@ def unregister_func(func):
     return func
 
 
+def lazy_operator(module, name, methods):
+    # registers a light class carrying only the rna side of an operator, `methods` are
+    # stubs that import `module` on first call and copy the real class' members over
+    def load(cls):
+        start = perf_counter()
+        real = getattr(importlib.import_module('.' + module, __package__), name)
+        for base in reversed(real.__mro__):
+            if base is object or base.__module__.startswith('bpy'):
+                continue
+            for key, value in vars(base).items():
+                if not key.startswith('__') and not key.startswith('bl_'):
+                    setattr(cls, key, value)
+        RegisterStuff.load_times[module] = perf_counter() - start
+        print('base_tools: loaded {} in {:.1f} ms'.format(module, RegisterStuff.load_times[module] * 1000))
+        stamp_modules()
+
+    def stub(method):
+        def forward(self, *args):
+            cls = type(self)
+            if getattr(cls, method) is stubs[method]:
+                load(cls)
+            return getattr(cls, method)(self, *args)
+
+        # blender checks the argument count of an operator's methods when registering it
+        if method in ('invoke', 'modal'):
+            def call(self, context, event):
+                return forward(self, context, event)
+        else:
+            def call(self, context):
+                return forward(self, context)
+        return call
+
+    def decorator(cls):
+        for method in methods:
+            setattr(cls, method, stubs.setdefault(method, stub(method)))
+        RegisterStuff.lazy_classes.append((cls, module, stubs))
+        return register_class(cls)
+
+    stubs = {}
+    return decorator
+
+
 def register():
-    print('register')
+    start = perf_counter()
     for cls in RegisterStuff.all_classes:
         bpy.utils.register_class(cls)
-        print('register', cls)
         RegisterStuff.registered_classes.append(cls)
 
     for func in RegisterStuff.register_fncs:
         func()
+    RegisterStuff.load_times['register'] = perf_counter() - start
+    print('base_tools: imported {} modules in {:.1f} ms, registered {} classes in {:.1f} ms'.format(
+        len(RegisterStuff.imported_modules), RegisterStuff.load_times['import'] * 1000,
+        len(RegisterStuff.registered_classes), RegisterStuff.load_times['register'] * 1000))
 
 
 def unregister():
-    print('unregister')
     for cls in RegisterStuff.registered_classes:
-        print('unregister', cls)
         bpy.utils.unregister_class(cls)
 
     RegisterStuff.registered_classes.clear()
@@ -57,20 +108,162 @@ def unregister():
         func()
 
 
-def import_modules():
-    RegisterStuff.clear_classes()
+def package_modules():
+    prefix = __package__ + '.'
+    return {name[len(prefix):]: module for name, module in list(sys.modules.items())
+            if name.startswith(prefix) and module is not None and name != __name__}
+
+
+def source_stamp(module, old=None):
+    # the mtime is enough to tell a file is untouched, the hash tells a touched file apart from an edited one
+    path = module.__file__
+    mtime = os.path.getmtime(path)
+    if old and old[0] == mtime:
+        return old
+    with open(path, 'rb') as f:
+        return mtime, hashlib.sha1(f.read()).hexdigest()
+
+
+def stamp_modules():
+    for name, module in package_modules().items():
+        if name not in RegisterStuff.sources:
+            RegisterStuff.sources[name] = source_stamp(module)
+
+
+def module_imports(module):
+    # the sibling modules a module imports, read from its source
+    with open(module.__file__) as f:
+        tree = ast.parse(f.read())
+    found = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.level == 1:
+            if node.module:
+                found.add(node.module.split('.')[0])
+            else:
+                found.update(alias.name for alias in node.names)
+    return found
+
+
+def reload_order(modules, changed):
+    # the changed modules and everything importing them, dependencies first
+    deps = {name: module_imports(module) & set(modules) for name, module in modules.items()}
+    affected = set(changed)
+    grown = True
+    while grown:
+        grown = False
+        for name, imports in deps.items():
+            if name not in affected and imports & affected:
+                affected.add(name)
+                grown = True
+
+    order = []
+    visiting = set()
 
+    def visit(name):
+        if name in order or name in visiting:
+            return
+        visiting.add(name)
+        for dep in sorted(deps[name] & affected):
+            visit(dep)
+        order.append(name)
+
+    for name in sorted(affected):
+        visit(name)
+    return order
+
+
+def eager_modules(modules):
+    # the modules imported when the add-on loads and everything they import
+    found = set()
+    pending = [name for name in RegisterStuff.module_names if name in modules]
+    while pending:
+        name = pending.pop()
+        if name not in found:
+            found.add(name)
+            pending += [dep for dep in module_imports(modules[name]) if dep in modules]
+    return found
+
+
+def maybe_reload():
+    # reloads only the modules whose source changed and their dependents, swapping just
+    # the classes they own; while the add-on is registered those are re-registered live
+    start = perf_counter()
+    modules = package_modules()
+    changed = []
+    for name, module in modules.items():
+        old = RegisterStuff.sources.get(name)
+        new = source_stamp(module, old)
+        RegisterStuff.sources[name] = new
+        if old and old[1] != new[1]:
+            changed.append(name)
+    if not changed:
+        return []
+
+    order = reload_order(modules, changed)
+    full_names = {__package__ + '.' + name for name in order}
+    live = bool(RegisterStuff.registered_classes)
+
+    owned = [cls for cls in RegisterStuff.registered_classes if cls.__module__ in full_names]
+    if live:
+        for cls in owned:
+            bpy.utils.unregister_class(cls)
+            RegisterStuff.registered_classes.remove(cls)
+        for func in RegisterStuff.unregister_fncs:
+            if func.__module__ in full_names:
+                func()
+
+    RegisterStuff.all_classes[:] = [cls for cls in RegisterStuff.all_classes if cls.__module__ not in full_names]
+    RegisterStuff.register_fncs[:] = [f for f in RegisterStuff.register_fncs if f.__module__ not in full_names]
+    RegisterStuff.unregister_fncs[:] = [f for f in RegisterStuff.unregister_fncs if f.__module__ not in full_names]
+    RegisterStuff.lazy_classes[:] = [entry for entry in RegisterStuff.lazy_classes if entry[0].__module__ not in full_names]
+
+    # operators that copied members from a reloaded module go back to their stubs
+    for cls, module, stubs in RegisterStuff.lazy_classes:
+        if module in order:
+            for method, stub in stubs.items():
+                setattr(cls, method, stub)
+            RegisterStuff.load_times.pop(module, None)
+
+    # modules only the lazy operators pull in are dropped instead of reloaded, so the
+    # next lazy import loads them fresh and records its time again
+    eager = eager_modules(modules)
+    for name in order:
+        if name in eager:
+            importlib.reload(modules[name])
+        else:
+            del sys.modules[modules[name].__name__]
+    imported = {module.__name__: module for module in RegisterStuff.imported_modules}
+    RegisterStuff.imported_modules[:] = [sys.modules[name] if name in full_names else module for name, module in imported.items()]
+
+    if live:
+        for cls in RegisterStuff.all_classes:
+            if cls.__module__ in full_names:
+                bpy.utils.register_class(cls)
+                RegisterStuff.registered_classes.append(cls)
+        for func in RegisterStuff.register_fncs:
+            if func.__module__ in full_names:
+                func()
+
+    RegisterStuff.load_times['reload'] = perf_counter() - start
+    print('base_tools: reloaded {} in {:.1f} ms'.format(', '.join(order), RegisterStuff.load_times['reload'] * 1000))
+    return order
+
+
+def import_modules():
     if RegisterStuff.imported_modules:
-        print('reload')
-        unregister()
-        for module in RegisterStuff.imported_modules:
-            importlib.reload(module)
-        RegisterStuff.imported_modules.clear()
+        maybe_reload()
+    else:
+        RegisterStuff.clear_classes()
 
+    start = perf_counter()
+    imported = {module.__name__ for module in RegisterStuff.imported_modules}
     for mdname in RegisterStuff.module_names:
+        if __package__ + '.' + mdname in imported:
+            continue
         exec(f'from . import {mdname}')
         RegisterStuff.imported_modules.append(locals()[mdname])
-        print('importing', locals()[mdname])
+    RegisterStuff.load_times['import'] = perf_counter() - start
+    stamp_modules()
 
 
 def add_modules(modules):
@@ -1,5 +1,7 @@
 import bpy
+from bpy.app.handlers import persistent
 from . register import register_class, register_func, unregister_func
+from . import timing
 
 @register_class
 class BaseToolsSettings(bpy.types.PropertyGroup):
@@ -10,16 +12,103 @@ class BaseToolsSettings(bpy.types.PropertyGroup):
         default=40
     )
 
+    blobsketch_budget: bpy.props.IntProperty(
+        name='Budget',
+        description='Polygons BlobSketch aims for, the resolution is picked to match (0 = use Resolution)',
+        min=0,
+        default=0
+    )
+
+    blobsketch_reduce: bpy.props.BoolProperty(
+        name='Reduce',
+        description='Decimate BlobSketch meshes that still come out over the polygon budget',
+        default=False
+    )
+
     blobsketch_quality: bpy.props.IntProperty(
         name='Quality',
         min=20,
         default=200,
     )
 
+    blobsketch_adaptive: bpy.props.FloatProperty(
+        name='Adaptive',
+        description='Place more BlobSketch samples where the stroke bends (0 = evenly spaced)',
+        min=0,
+        max=1,
+        default=0
+    )
+
+    blobsketch_batch: bpy.props.BoolProperty(
+        name='Batch',
+        description='Queue BlobSketch strokes and mesh them together when the tool finishes',
+        default=False
+    )
+
+    blobsketch_background: bpy.props.BoolProperty(
+        name='Background',
+        description='Compute BlobSketch geometry on a worker thread while you keep drawing',
+        default=False
+    )
+
+    blobsketch_preview: bpy.props.BoolProperty(
+        name='Preview',
+        description='Show the BlobSketch circles while the stroke is being drawn',
+        default=False
+    )
+
+    blobsketch_medial: bpy.props.EnumProperty(
+        name='Medial Axis',
+        description='How BlobSketch fills the stroke with circles',
+        items=[
+            ('STEP', 'Step Search', 'push each boundary point inwards until it stops growing'),
+            ('DELAUNAY', 'Delaunay', 'use the delaunay triangulation of the stroke, better for thin and branching strokes')
+        ],
+        default='STEP'
+    )
+
+    blobsketch_mesher: bpy.props.EnumProperty(
+        name='Mesher',
+        description='How BlobSketch turns the circles into a mesh',
+        items=[
+            ('METABALL', 'Metaball', 'add a metaball and convert it to a mesh'),
+            ('NATIVE', 'Native', 'polygonize the blob field directly into a new mesh')
+        ],
+        default='METABALL'
+    )
+
+    blobsketch_projection: bpy.props.EnumProperty(
+        name='Projection',
+        description='Where BlobSketch places the blobs',
+        items=[
+            ('VIEW', 'View Plane', 'on the plane through the 3d cursor facing the view'),
+            ('SURFACE', 'Surface', 'on the visible meshes under the stroke, the cursor plane where it misses them')
+        ],
+        default='VIEW'
+    )
+
+    profiling: bpy.props.BoolProperty(
+        name='Profile',
+        description='Record how long each stage of the tools takes, shown in the viewport and the panel',
+        default=False,
+        update=lambda self, context: timing.enable(self.profiling)
+    )
+
+@persistent
+def sync_profiling(*args):
+    # the update callback only runs on edits, so a file saved with profiling on
+    # switches the profiler on here; the context has no scene while blender starts
+    scene = getattr(bpy.context, 'scene', None)
+    timing.enable(scene is not None and scene.base_tools.profiling)
+
 @register_func
 def register():
     bpy.types.Scene.base_tools = bpy.props.PointerProperty(type=BaseToolsSettings)
+    bpy.app.handlers.load_post.append(sync_profiling)
+    sync_profiling()
 
 @unregister_func
 def unregister():
+    if sync_profiling in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(sync_profiling)
     del bpy.types.Scene.base_tools
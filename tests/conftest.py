@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules are loaded through the same headless package the scripts use
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
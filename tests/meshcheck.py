@@ -0,0 +1,30 @@
+import numpy as np
+
+
+def directed_edges(faces):
+    return np.stack((faces, np.roll(faces, -1, axis=1)), axis=-1).reshape(-1, 2)
+
+
+def is_closed_manifold(faces):
+    # every edge shared by exactly two faces, running opposite ways in them
+    edges = directed_edges(faces)
+    _, directed = np.unique(edges, axis=0, return_counts=True)
+    _, undirected = np.unique(np.sort(edges, axis=1), axis=0, return_counts=True)
+    return (directed == 1).all() and (undirected == 2).all()
+
+
+def volume(co, faces):
+    a, b, c = co[faces[:, 0]], co[faces[:, 1]], co[faces[:, 2]]
+    return (a * np.cross(b, c)).sum() / 6
+
+
+def box(lo, hi):
+    co = np.array([(x, y, z) for x in (lo[0], hi[0]) for y in (lo[1], hi[1]) for z in (lo[2], hi[2])], dtype=np.float64)
+    quads = [(0, 1, 3, 2), (4, 6, 7, 5), (0, 4, 5, 1), (2, 3, 7, 6), (0, 2, 6, 4), (1, 5, 7, 3)]
+    tris = [(a, b, c) for a, b, c, d in quads] + [(a, c, d) for a, b, c, d in quads]
+    return co, np.array(tris, dtype=np.int64)
+
+
+def circle(n, radius=100.0):
+    t = np.linspace(0, 2 * np.pi, n, endpoint=False)
+    return np.stack((np.cos(t), np.sin(t)), axis=1) * radius
@@ -0,0 +1,69 @@
+import numpy as np
+
+from headless import load
+from meshcheck import circle
+
+geometry = load('geometry')
+
+
+def star(n=300):
+    t = np.linspace(0, 2 * np.pi, n, endpoint=False)
+    return np.stack((np.cos(t), np.sin(t)), axis=1) * (100 + 40 * np.sin(7 * t))[:, None]
+
+
+def test_medial_search_circle():
+    loop = circle(250)
+    centers, radii = geometry.medial_search(loop)
+    assert np.allclose(radii, 100, rtol=0.005)
+    assert np.abs(centers).max() < 0.5
+
+
+def test_segment_grid_distance():
+    loop = star()
+    grid = geometry.SegmentGrid(loop)
+    pts = np.random.default_rng(0).uniform(-140, 140, (2000, 2))
+    expected = geometry.segment_distances(pts, *geometry.loop_edges(loop))
+    assert np.allclose(grid.distance(pts), expected)
+
+
+def test_segment_grid_inside():
+    grid = geometry.SegmentGrid(circle(200))
+    pts = np.random.default_rng(1).uniform(-120, 120, (2000, 2))
+    r = np.sqrt((pts ** 2).sum(axis=1))
+    clear = np.abs(r - 100) > 1
+    assert (grid.inside(pts)[clear] == (r[clear] < 100)).all()
+    assert (grid.radius(pts)[r > 101] == 0).all()
+
+
+def test_chain_index_matches_grid():
+    # the chain closes with the chord back to its first point, like the loop
+    loop = star()
+    index = geometry.ChainIndex()
+    for chunk in np.array_split(loop, 13):
+        index.extend(chunk)
+    grid = geometry.SegmentGrid(loop)
+    pts = np.random.default_rng(2).uniform(-140, 140, (2000, 2))
+    assert np.allclose(index.distance(pts), grid.distance(pts))
+    assert (index.inside(pts) == grid.inside(pts)).all()
+
+
+def test_medial_preview_matches_search():
+    preview = geometry.MedialPreview(budget=float('inf'))
+    for point in circle(400, 150):
+        preview.add_point(point)
+    while preview.update():
+        pass
+    centers, radii = geometry.medial_search(preview.samples, preview.precision)
+    assert np.allclose(preview.radii, radii)
+    assert np.allclose(preview.centers, centers)
+
+
+def test_loose_parts():
+    # two triangles, a lone edge and an isolated vertex
+    edges = np.array([(0, 1), (1, 2), (2, 0), (3, 4), (4, 5), (5, 3), (6, 7)])
+    labels, count = geometry.loose_parts(9, edges)
+    assert count == 4
+    assert len(set(labels[[0, 1, 2]])) == 1
+    assert len(set(labels[[3, 4, 5]])) == 1
+    assert labels[6] == labels[7]
+    assert len({labels[0], labels[3], labels[6], labels[8]}) == 4
@@ -0,0 +1,44 @@
+import numpy as np
+
+from headless import load
+from meshcheck import is_closed_manifold, volume
+
+mesher = load('mesher')
+
+
+def test_every_case_closes():
+    # each crossed edge of a cube is cut exactly once by the triangles of its case
+    for case in range(256):
+        inside = [(case >> i) & 1 for i in range(8)]
+        crossed = {k for k, (a, b) in enumerate(mesher.CUBE_EDGES.tolist()) if inside[a] != inside[b]}
+        cut = [edge for cycle in mesher.cube_cycles(case) for edge in cycle]
+        assert sorted(cut) == sorted(crossed)
+
+
+def test_ball_volume():
+    # one ball's surface sits where stiffness * (1 - d^2 / r^2)^3 meets the threshold
+    co, faces = mesher.polygonize_balls(np.zeros((1, 3)), np.ones(1), 0.05, threshold=0.01)
+    assert is_closed_manifold(faces)
+    radius = np.sqrt(1 - (0.01 / 2) ** (1 / 3))
+    assert np.isclose(volume(co, faces), 4 / 3 * np.pi * radius ** 3, rtol=0.01)
+
+
+def test_blobs_are_manifold():
+    t = np.linspace(0, 4 * np.pi, 60)
+    centers = np.stack((np.cos(t) * t, np.sin(t) * t, np.zeros_like(t)), axis=1) * 0.1
+    radii = 0.1 + 0.05 * np.sin(3 * t) ** 2
+    co, faces = mesher.polygonize_balls(centers, radii, 0.02)
+    assert len(faces)
+    assert is_closed_manifold(faces)
+    assert volume(co, faces) > 0
+
+
+def test_budget_voxel_skips_zero_radii():
+    # a figure eight has zero radii where it crosses itself
+    t = np.linspace(0, 2 * np.pi, 200, endpoint=False)
+    centers = np.stack((np.sin(t), np.sin(t) * np.cos(t), np.zeros_like(t)), axis=1)
+    radii = np.where(np.arange(200) % 2, 0.1, 0.0)
+    voxel = mesher.budget_voxel(centers, radii, 5000)
+    assert voxel > 0
+    faces = mesher.polygonize_balls(centers, radii, voxel)[1]
+    assert 0.5 * 5000 < len(faces) < 2 * 5000
@@ -0,0 +1,35 @@
+import numpy as np
+
+from headless import load
+from meshcheck import box, is_closed_manifold, volume
+
+voxel = load('voxel')
+
+
+def test_box_operations():
+    a = box((0, 0, 0), (1, 1, 1))
+    b = box((0.5, 0.25, 0.25), (1.5, 0.75, 0.75))
+    for operation, expected in (('UNION', 1.125), ('DIFFERENCE', 0.875), ('INTERSECT', 0.125)):
+        co, faces = voxel.voxel_boolean([a, b], operation, 0.02)
+        assert is_closed_manifold(faces)
+        assert np.isclose(volume(co, faces), expected, rtol=0.02)
+
+
+def test_self_intersecting_operand():
+    # two overlapping boxes in one mesh, their overlap is inside by winding number
+    a = box((0, 0, 0), (1, 1, 1))
+    b = box((0.5, 0.3, 0.3), (1.5, 0.7, 0.7))
+    mesh = np.concatenate((a[0], b[0])), np.concatenate((a[1], b[1] + len(a[0])))
+    slab = box((-1, -1, 0.45), (2, 2, 0.55))
+    co, faces = voxel.voxel_boolean([mesh, slab], 'INTERSECT', 0.02)
+    assert is_closed_manifold(faces)
+    assert np.isclose(volume(co, faces), 0.12, rtol=0.03)
+
+
+def test_workers_match_serial():
+    a = box((0, 0, 0), (1, 1, 1))
+    b = box((0.5, 0.25, 0.25), (1.5, 0.75, 0.75))
+    serial = voxel.voxel_boolean([a, b], 'DIFFERENCE', 0.02)
+    pooled = voxel.voxel_boolean([a, b], 'DIFFERENCE', 0.02, workers=2, chunk=16)
+    assert np.allclose(serial[0], pooled[0])
+    assert (serial[1] == pooled[1]).all()
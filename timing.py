@@ -0,0 +1,117 @@
+import bpy
+import json
+from collections import deque
+from threading import Lock
+from time import perf_counter
+from . register import register_class
+
+
+class NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+null_stage = NullStage()
+
+
+class Stage:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, perf_counter() - self.start)
+
+
+class Profiler:
+    # rolling wall times per stage and the last value of each count;
+    # jobs record from the worker thread too, hence the lock
+    def __init__(self, window=100):
+        self.window = window
+        self.times = {}
+        self.totals = {}
+        self.counts = {}
+        self.lock = Lock()
+
+    def record(self, name, seconds):
+        with self.lock:
+            if name not in self.times:
+                self.times[name] = deque(maxlen=self.window)
+                self.totals[name] = [0, 0.0]
+            self.times[name].append(seconds)
+            self.totals[name][0] += 1
+            self.totals[name][1] += seconds
+
+    def count(self, name, value):
+        self.counts[name] = value
+
+    def summary(self):
+        with self.lock:
+            times = {name: list(values) for name, values in self.times.items()}
+        lines = []
+        for name, values in times.items():
+            lines.append('{}: {:.1f} ms  mean {:.1f}  max {:.1f}  ({})'.format(
+                name, values[-1] * 1000, sum(values) / len(values) * 1000, max(values) * 1000, self.totals[name][0]))
+        lines += ['{}: {}'.format(name, value) for name, value in self.counts.items()]
+        return lines
+
+    def dump(self, path):
+        with self.lock:
+            data = {
+                'stages': {name: {'calls': calls, 'total': total, 'recent': list(self.times[name])}
+                           for name, (calls, total) in self.totals.items()},
+                'counts': dict(self.counts),
+            }
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=1)
+
+
+profiler = None
+
+
+def enable(on):
+    global profiler
+    if not on:
+        profiler = None
+    elif profiler is None:
+        profiler = Profiler()
+
+
+def stage(name):
+    return Stage(profiler, name) if profiler else null_stage
+
+
+def count(name, value):
+    if profiler:
+        profiler.count(name, value)
+
+
+@register_class
+class ProfileDump(bpy.types.Operator):
+    bl_idname = 'base_tools.profile_dump'
+    bl_label = 'Dump Profile'
+    bl_description = 'Write the recorded stage timings to a json file'
+
+    filepath: bpy.props.StringProperty(subtype='FILE_PATH', default='base_tools_profile.json')
+
+    @classmethod
+    def poll(cls, context):
+        return profiler is not None
+
+    def invoke(self, context, event):
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def execute(self, context):
+        profiler.dump(bpy.path.abspath(self.filepath))
+        self.report({'INFO'}, 'profile written to ' + self.filepath)
+        return {'FINISHED'}
@@ -1,5 +1,6 @@
 import bpy
-from .register import register_class
+from .register import register_class, RegisterStuff
+from . import timing
 
 @register_class
 class BaseTools_PT_BlobSketch(bpy.types.Panel):
@@ -14,7 +15,17 @@ class BaseTools_PT_BlobSketch(bpy.types.Panel):
         col = layout.column(align=True)
         col.operator('base_tools.blobsketch')
         col.prop(context.scene.base_tools, 'blobsketch_resoluition')
+        row = col.row(align=True)
+        row.prop(context.scene.base_tools, 'blobsketch_budget')
+        row.prop(context.scene.base_tools, 'blobsketch_reduce', toggle=True)
         col.prop(context.scene.base_tools, 'blobsketch_quality')
+        col.prop(context.scene.base_tools, 'blobsketch_adaptive')
+        col.prop(context.scene.base_tools, 'blobsketch_medial', text='')
+        col.prop(context.scene.base_tools, 'blobsketch_mesher', text='')
+        col.prop(context.scene.base_tools, 'blobsketch_projection', text='')
+        col.prop(context.scene.base_tools, 'blobsketch_batch')
+        col.prop(context.scene.base_tools, 'blobsketch_background')
+        col.prop(context.scene.base_tools, 'blobsketch_preview')
 
 @register_class
 class BaseTools_PT_Boolean(bpy.types.Panel):
@@ -31,3 +42,31 @@ class BaseTools_PT_Boolean(bpy.types.Panel):
         col.operator('base_tools.boolean', text='difference').operation = 'DIFFERENCE'
         col.operator('base_tools.boolean', text='intersect').operation = 'INTERSECT'
         col.operator('base_tools.boolean', text='slice').operation = 'SLICE'
+        col.operator('base_tools.boolean', text='merge').operation = 'MERGE'
+
+        col.label(text='voxel')
+        for operation in ('UNION', 'DIFFERENCE', 'INTERSECT', 'MERGE'):
+            props = col.operator('base_tools.boolean', text=operation.lower())
+            props.operation = operation
+            props.backend = 'VOXEL'
+
+
+@register_class
+class BaseTools_PT_Profile(bpy.types.Panel):
+    bl_category = 'base_tools'
+    bl_label = 'Profile'
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = 'UI'
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw(self, context):
+        layout = self.layout
+
+        col = layout.column(align=True)
+        col.prop(context.scene.base_tools, 'profiling')
+        if timing.profiler:
+            for line in timing.profiler.summary():
+                col.label(text=line)
+            for name, seconds in RegisterStuff.load_times.items():
+                col.label(text='load {}: {:.1f} ms'.format(name, seconds * 1000))
+            col.operator('base_tools.profile_dump')
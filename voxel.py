@@ -0,0 +1,193 @@
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from .geometry import expand_ranges
+from .mesher import marching_cubes, pack_keys, grid_coords
+
+
+class AxisCrossings:
+    # where the lattice lines running along one axis pierce a triangle mesh, and which way
+    # the triangle faces along the axis; sorted by line and then by position so a lattice
+    # point finds its neighbours by bisection
+    def __init__(self, co, tris, axis, chunk=1 << 21):
+        self.axis = axis
+        self.u, self.v = (axis + 1) % 3, (axis + 2) % 3
+        uv = [self.u, self.v]
+        a, b, c = co[tris[:, 0]], co[tris[:, 1]], co[tris[:, 2]]
+        lo = np.ceil(np.minimum(np.minimum(a, b), c)[:, uv]).astype(np.int64)
+        hi = np.floor(np.maximum(np.maximum(a, b), c)[:, uv]).astype(np.int64)
+        ext = np.maximum(hi - lo + 1, 0)
+        counts = ext.prod(axis=1)
+
+        lines = []
+        positions = []
+        facing = []
+        bounds = np.searchsorted(np.cumsum(counts), np.arange(chunk, counts.sum() + chunk, chunk))
+        for t0, t1 in zip(np.concatenate(([0], bounds[:-1])), bounds):
+            t1 = max(t1, t0 + 1)
+            tri, k = expand_ranges(np.zeros(t1 - t0, dtype=np.int64), counts[t0:t1])
+            tri += t0
+            line = lo[tri] + np.stack((k // ext[tri, 1], k % ext[tri, 1]), axis=1)
+            pa, pb, pc = a[tri][:, uv], b[tri][:, uv], c[tri][:, uv]
+            w0 = cross2(pb - line, pc - line)
+            w1 = cross2(pc - line, pa - line)
+            w2 = cross2(pa - line, pb - line)
+            area = w0 + w1 + w2
+            hit = (area != 0) & (((w0 >= 0) & (w1 >= 0) & (w2 >= 0)) | ((w0 <= 0) & (w1 <= 0) & (w2 <= 0)))
+            tri = tri[hit]
+            pos = (w0[hit] * a[tri, axis] + w1[hit] * b[tri, axis] + w2[hit] * c[tri, axis]) / area[hit]
+            lines.append(line[hit])
+            positions.append(pos)
+            # the projected area carries the sign of the normal's component along the axis
+            facing.append(np.sign(area[hit]).astype(np.int64))
+
+        lines = np.concatenate(lines) if lines else np.zeros((0, 2), dtype=np.int64)
+        pos = np.concatenate(positions) if positions else np.zeros(0)
+        facing = np.concatenate(facing) if facing else np.zeros(0, dtype=np.int64)
+        self.span = int(np.ceil(co[:, axis].max())) + 2 if len(co) else 2
+        keys = lines[:, 0] * (1 << 31) + lines[:, 1]
+        order = np.lexsort((pos, keys))
+        self.lines = lines[order]
+        self.pos = pos[order]
+        self.keys, rank = np.unique(keys[order], return_inverse=True)
+        self.starts = np.searchsorted(rank, np.arange(len(self.keys) + 1))
+        self.sorted_values = rank * self.span + self.pos
+        self.facing = np.concatenate(([0], np.cumsum(facing[order])))
+
+    def query(self, points):
+        # winding number of each point, the signed crossings past it along the axis,
+        # and the distance to the nearest crossing
+        n = len(self.keys)
+        winding = np.zeros(len(points), dtype=np.int64)
+        dist = np.full(len(points), np.inf)
+        if not n:
+            return winding, dist
+
+        keys = points[:, self.u] * (1 << 31) + points[:, self.v]
+        rank = np.clip(np.searchsorted(self.keys, keys), 0, n - 1)
+        found = self.keys[rank] == keys
+        rank, p = rank[found], points[found, self.axis]
+        start, end = self.starts[rank], self.starts[rank + 1]
+        k = np.clip(np.searchsorted(self.sorted_values, rank * self.span + p), start, end)
+        winding[found] = self.facing[end] - self.facing[k]
+
+        after = np.where(k < end, self.pos[np.minimum(k, len(self.pos) - 1)] - p, np.inf)
+        before = np.where(k > start, p - self.pos[np.maximum(k - 1, 0)], np.inf)
+        dist[found] = np.minimum(after, before)
+        return winding, dist
+
+    def cell_points(self):
+        # lower lattice point of every lattice edge a crossing lies on
+        points = np.empty((len(self.pos), 3), dtype=np.int64)
+        points[:, self.axis] = np.floor(self.pos)
+        points[:, self.u] = self.lines[:, 0]
+        points[:, self.v] = self.lines[:, 1]
+        return points
+
+
+def cross2(a, b):
+    return a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]
+
+
+def operand_crossings(co, tris, origin, voxel):
+    co = (np.asarray(co, dtype=np.float64) - origin) / voxel
+    tris = np.asarray(tris, dtype=np.int64).reshape(-1, 3)
+    return [AxisCrossings(co, tris, axis) for axis in range(3)]
+
+
+def signed_field(points, crossings, band=2.0):
+    # truncated signed distance in voxels, negative inside: the sign is the winding number
+    # along z, so overlapping shells of a self intersecting mesh stay inside, the magnitude
+    # the nearest crossing along any of the three lattice lines
+    winding, dist = crossings[2].query(points)
+    for axis in (0, 1):
+        dist = np.minimum(dist, crossings[axis].query(points)[1])
+    dist = np.minimum(dist, band)
+    return np.where(winding != 0, -dist, dist)
+
+
+def csg_field(points, operands, operation):
+    field = signed_field(points, operands[0])
+    for crossings in operands[1:]:
+        other = signed_field(points, crossings)
+        if operation == 'UNION':
+            field = np.minimum(field, other)
+        elif operation == 'INTERSECT':
+            field = np.maximum(field, other)
+        else:
+            field = np.maximum(field, -other)
+    return field
+
+
+def block_field(blocks, operands, operation, block_size):
+    n = block_size + 1
+    lattice = np.stack(np.meshgrid(np.arange(n), np.arange(n), np.arange(n), indexing='ij'), axis=-1).reshape(-1, 3)
+    points = (blocks[:, None] * block_size + lattice[None]).reshape(-1, 3)
+    return csg_field(points, operands, operation).reshape(len(blocks), n, n, n)
+
+
+def surface_blocks(operands, block_size):
+    # every block whose closed lattice holds a crossing edge, blocks sharing the edge
+    # on a face are included too so all four cells around it get meshed
+    points = np.concatenate([axis.cell_points() for crossings in operands for axis in crossings])
+    if not len(points):
+        return np.zeros((0, 3), dtype=np.int64)
+    found = []
+    for off in [(x, y, z) for x in (0, -1) for y in (0, -1) for z in (0, -1)]:
+        off = np.array(off)
+        keep = ((off == 0) | (points % block_size == 0)).all(axis=1)
+        found.append((points[keep] + off) // block_size)
+    found = np.concatenate(found)
+    dims = found.max(axis=0) + 1
+    return grid_coords(np.unique(pack_keys(found, dims)), dims)
+
+
+shared = None
+
+
+def fork_context():
+    # forked workers inherit the operands instead of unpickling them, and spawned ones
+    # would start a fresh interpreter; without fork the field is computed serially
+    try:
+        return multiprocessing.get_context('fork')
+    except ValueError:
+        return None
+
+
+def worker_field(blocks):
+    return block_field(blocks, *shared)
+
+
+def voxel_boolean(meshes, operation, voxel, block_size=8, workers=1, chunk=256):
+    # meshes are (co, tris) arrays in one space, the first is combined with all the others;
+    # cost follows the voxels on the surfaces, not the triangle counts
+    co = np.concatenate([np.asarray(c, dtype=np.float64).reshape(-1, 3) for c, _ in meshes])
+    # an odd offset keeps the lattice off the grid aligned coordinates modelled meshes tend to have
+    origin = co.min(axis=0) - voxel * (2 + np.array((0.0137, 0.0291, 0.0419)))
+    operands = [operand_crossings(c, t, origin, voxel) for c, t in meshes]
+    blocks = surface_blocks(operands, block_size)
+    empty = np.zeros((0, 3)), np.zeros((0, 3), dtype=np.int64)
+    if not len(blocks):
+        return empty
+
+    parts = [blocks[i:i + chunk] for i in range(0, len(blocks), chunk)]
+    context = fork_context() if workers > 1 and len(parts) > 1 else None
+    if context:
+        global shared
+        shared = operands, operation, block_size
+        try:
+            with ProcessPoolExecutor(workers, mp_context=context) as pool:
+                field = np.concatenate(list(pool.map(worker_field, parts)))
+        finally:
+            shared = None
+    else:
+        field = np.concatenate([block_field(part, operands, operation, block_size) for part in parts])
+
+    # the mesher wants the inside above the threshold
+    field = -field
+    changes = (field >= 0).reshape(len(blocks), -1)
+    keep = changes.any(axis=1) & ~changes.all(axis=1)
+    if not keep.any():
+        return empty
+    return marching_cubes(blocks[keep], field[keep], origin, voxel, block_size, 0.0)